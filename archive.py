@@ -0,0 +1,115 @@
+"""
+Order archival for Online Bookstore
+Moves old Delivered/Cancelled orders (and their items) out of the hot
+orders/order_items tables into archive tables, in chunks, and provides
+lookups that search the hot tables first and the archive second
+"""
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from models import db, Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+
+# Orders in these states never change again, so they can be archived
+FINISHED_STATUSES = ('Delivered', 'Cancelled')
+
+
+def _copy_rows(source, target, condition, *extra):
+    """INSERT ... SELECT the rows matching condition from source into target"""
+    columns = [column.name for column in source.__table__.columns]
+    values = list(source.__table__.columns)
+    for name, value in extra:
+        columns.append(name)
+        values.append(db.literal(value))
+
+    select = db.select(*values).where(condition)
+    db.session.execute(target.__table__.insert().from_select(columns, select))
+
+
+def archive_orders(days, batch_size):
+    """
+    Archive finished orders older than the given number of days
+    Each chunk is its own transaction, returns the number of orders moved
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    moved = 0
+
+    # The newest order always stays, so SQLite never reuses an archived id
+    newest_id = db.session.query(db.func.max(Order.id)).scalar()
+
+    while True:
+        ids = [row[0] for row in db.session.query(Order.id).filter(
+            Order.status.in_(FINISHED_STATUSES),
+            Order.order_date < cutoff,
+            Order.id != newest_id
+        ).limit(batch_size).all()]
+        if not ids:
+            break
+
+        # Copy orders before items and delete items before orders, so foreign keys hold
+        _copy_rows(Order, ArchivedOrder, Order.id.in_(ids), ('archived_at', datetime.utcnow()))
+        _copy_rows(OrderItem, ArchivedOrderItem, OrderItem.order_id.in_(ids))
+        db.session.execute(OrderItem.__table__.delete().where(OrderItem.order_id.in_(ids)))
+        db.session.execute(Order.__table__.delete().where(Order.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+
+    return moved
+
+
+def find_order(order_id):
+    """Look an order up in the hot table, then in the archive"""
+    return db.session.get(Order, order_id) or db.session.get(ArchivedOrder, order_id)
+
+
+# Columns needed to list an order from its stored summary
+SUMMARY_COLUMNS = ('id', 'order_date', 'status', 'total_amount',
+                   'item_count', 'total_quantity', 'summary_titles')
+
+
+def _summary_select(model, user_id):
+    return db.select(*[getattr(model, name) for name in SUMMARY_COLUMNS]).where(model.user_id == user_id)
+
+
+def order_history(user_id, page=1, per_page=10, include_archived=False):
+    """
+    One page of a user's orders, newest first, as lightweight summary rows
+    The archive is only read when asked for. Returns (rows, has_next)
+    """
+    query = _summary_select(Order, user_id)
+    if include_archived:
+        query = db.union_all(query, _summary_select(ArchivedOrder, user_id))
+
+    orders = query.subquery()
+    rows = db.session.execute(
+        db.select(orders).order_by(orders.c.order_date.desc())
+        .offset((page - 1) * per_page).limit(per_page + 1)
+    ).all()
+    return rows[:per_page], len(rows) > per_page
+
+
+def archived_count(user_id=None):
+    """Number of archived orders, overall or for one user"""
+    query = db.session.query(db.func.count(ArchivedOrder.id))
+    if user_id is not None:
+        query = query.filter(ArchivedOrder.user_id == user_id)
+    return query.scalar()
+
+
+@click.command('archive-orders')
+@click.option('--days', type=int, default=None, help='Archive finished orders older than this many days')
+@click.option('--batch-size', type=int, default=None, help='Orders moved per transaction')
+@with_appcontext
+def archive_orders_command(days, batch_size):
+    """Move old Delivered/Cancelled orders to the archive tables"""
+    days = days if days is not None else current_app.config['ORDER_ARCHIVE_AFTER_DAYS']
+    batch_size = batch_size or current_app.config['ORDER_ARCHIVE_BATCH_SIZE']
+    moved = archive_orders(days, batch_size)
+    print(f'Archived {moved} orders older than {days} days.')
+
+
+def init_app(app):
+    """Register the archive CLI command"""
+    app.cli.add_command(archive_orders_command)
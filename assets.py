@@ -0,0 +1,95 @@
+"""
+Static asset fingerprinting and service worker for Online Bookstore
+url_for('static', ...) adds a content hash (?v=...) to every static URL, so
+those responses can be cached forever by the browser and the service worker.
+The service worker itself is served at /sw.js, registered with the current
+ASSET_VERSION; a deploy that changes any static file or template changes the
+version, which installs a fresh worker that drops the old caches.
+Pages showing flash messages or a non-empty cart are sent with no-store, so
+neither the browser nor the service worker replays them.
+"""
+import hashlib
+import os
+
+from flask import current_app, request, send_from_directory, session
+from flask.globals import request_ctx
+
+SERVICE_WORKER = 'js/sw.js'
+
+_fingerprints = {}  # path -> ((mtime_ns, size), hash)
+
+
+def fingerprint(path):
+    """Short content hash of a file, recomputed only when the file changes"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _fingerprints.get(path)
+    if cached is None or cached[0] != key:
+        with open(path, 'rb') as file:
+            cached = _fingerprints[path] = (key, hashlib.md5(file.read()).hexdigest()[:12])
+    return cached[1]
+
+
+def _tree_version(*directories, skip=()):
+    """Hash over every file under the given directories"""
+    digest = hashlib.md5()
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = sorted(name for name in dirs if os.path.join(root, name) not in skip)
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest.update(path[len(directory):].encode())
+                digest.update((fingerprint(path) or '').encode())
+    return digest.hexdigest()[:12]
+
+
+def asset_version(app):
+    """ASSET_VERSION if set (e.g. the deployed commit), else a hash of static files and templates"""
+    if app.config.get('ASSET_VERSION'):
+        return app.config['ASSET_VERSION']
+    # Covers are fingerprinted one by one, so uploads don't invalidate everything
+    covers = app.config['UPLOAD_FOLDER']
+    return _tree_version(app.static_folder, os.path.join(app.root_path, app.template_folder),
+                         skip={covers})
+
+
+def init_app(app):
+    """Fingerprint static URLs, cache them long-term and serve the service worker"""
+    app.config['ASSET_VERSION'] = asset_version(app)
+
+    @app.context_processor
+    def inject_asset_version():
+        return {'asset_version': app.config['ASSET_VERSION']}
+
+    @app.url_defaults
+    def add_fingerprint(endpoint, values):
+        if endpoint == 'static' and 'v' not in values and 'filename' in values:
+            version = fingerprint(os.path.join(app.static_folder, values['filename']))
+            if version:
+                values['v'] = version
+
+    @app.after_request
+    def cache_fingerprinted(response):
+        if request.endpoint == 'static' and request.args.get('v') and response.status_code == 200:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = 365 * 24 * 3600
+            response.cache_control.immutable = True
+        return response
+
+    @app.after_request
+    def no_store_session_pages(response):
+        # request_ctx.flashes is only set once a template has read the flashes
+        if response.mimetype == 'text/html' and (request_ctx.flashes or session.get('cart')):
+            response.cache_control.no_store = True
+        return response
+
+    # Served from the site root so the worker's scope covers every page
+    @app.route('/sw.js')
+    def service_worker():
+        response = send_from_directory(current_app.static_folder, SERVICE_WORKER, max_age=0)
+        response.cache_control.no_cache = True
+        return response
@@ -0,0 +1,190 @@
+"""
+Username/email availability for Online Bookstore
+Each worker keeps Bloom filters of every registered username and email. A
+name the filter has never seen is certainly free and is answered without a
+query; only possible matches (taken, or a rare false positive) are looked up
+in the indexed users table.
+
+The filters are filled in a background thread at startup, extended on
+register() and profile changes, and topped up every
+AVAILABILITY_REFRESH_INTERVAL seconds with users registered or changed
+through other workers (an id range scan on the primary key plus an
+updated_at range scan). Until the first fill completes every check goes to
+the database. The unique constraints on users remain the final word when
+registering.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db, User
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings"""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Two 64-bit hashes combined give all k positions (Kirsch-Mitzenmacher)
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+# How far each refresh looks back before the previous one for changed users
+CHANGE_OVERLAP_SECONDS = 60
+
+
+class AvailabilityIndex:
+    """Bloom filters of the taken usernames and emails"""
+
+    def __init__(self, capacity, error_rate):
+        self.usernames = BloomFilter(capacity, error_rate)
+        self.emails = BloomFilter(capacity, error_rate)
+        self.last_user_id = 0
+        self.changed_since = None  # users updated from then on are re-read
+        self.capacity = capacity
+        self.count = 0
+        self.refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, username=None, email=None):
+        if username:
+            self.usernames.add(username)
+        if email:
+            self.emails.add(email)
+
+    def load_changes(self):
+        """Add users with ids above the last one seen and users updated since the last load"""
+        with self._lock:
+            # Overlap the previous load, so a change committed just after it
+            # (but stamped before it) is not missed; adding twice is harmless
+            started = datetime.utcnow() - timedelta(seconds=CHANGE_OVERLAP_SECONDS)
+            rows = db.session.query(User.id, User.username, User.email) \
+                .filter(User.id > self.last_user_id).order_by(User.id).all()
+            # Only new users grow the filters' population (a changed email leaves
+            # its old bits behind, but changes are rare next to registrations)
+            self.count += len(rows)
+            if self.changed_since is not None:
+                rows += db.session.query(User.id, User.username, User.email) \
+                    .filter(User.updated_at >= self.changed_since, User.id <= self.last_user_id).all()
+            for user_id, username, email in rows:
+                self.add(username, email)
+                self.last_user_id = max(self.last_user_id, user_id)
+            self.changed_since = started
+            self.refreshed_at = time.monotonic()
+            return len(rows)
+
+    @property
+    def overfull(self):
+        """Past its capacity the false positive rate climbs, so it should be rebuilt"""
+        return self.count > self.capacity
+
+
+_index = None
+_building = threading.Lock()
+_build_started_at = 0.0
+
+
+def build(app):
+    """Fill a new index from the users table and make it current"""
+    global _index
+    with app.app_context():
+        # e.g. `flask init-db` on a fresh install
+        if not db.inspect(db.engine).has_table(User.__tablename__):
+            return None
+        user_count = db.session.query(db.func.count(User.id)).scalar()
+        # Leave room to grow before a rebuild is needed
+        capacity = max(user_count * 2, app.config['AVAILABILITY_MIN_CAPACITY'])
+        index = AvailabilityIndex(capacity, app.config['AVAILABILITY_ERROR_RATE'])
+        index.load_changes()
+        db.session.remove()
+    _index = index
+    return index
+
+
+def _start_build(app):
+    """Build in a background thread unless a build is already running"""
+    global _build_started_at
+    if not _building.acquire(blocking=False):
+        return
+    _build_started_at = time.monotonic()
+
+    def run():
+        try:
+            build(app)
+        except Exception:
+            app.logger.exception('Building the availability filters failed')
+        finally:
+            _building.release()
+
+    threading.Thread(target=run, daemon=True, name='availability-build').start()
+
+
+def wait_ready(app):
+    """Block until the filters are filled, building them now if no build is running"""
+    with _building:
+        if _index is None:
+            build(app)
+    return _index
+
+
+def _current_index():
+    """The ready index, topped up with recent registrations, or None"""
+    index = _index
+    interval = current_app.config['AVAILABILITY_REFRESH_INTERVAL']
+    if index is None:
+        # The startup build failed or found no users table; try again now and then
+        if current_app.config['AVAILABILITY_FILTER_ENABLED'] and time.monotonic() - _build_started_at >= interval:
+            _start_build(current_app._get_current_object())
+        return None
+    if time.monotonic() - index.refreshed_at >= interval:
+        index.load_changes()
+        if index.overfull:
+            _start_build(current_app._get_current_object())
+    return index
+
+
+def username_available(username):
+    """Check if nobody has registered this username"""
+    index = _current_index()
+    if index is not None and username not in index.usernames:
+        return True
+    return db.session.query(User.id).filter_by(username=username).first() is None
+
+
+def email_available(email):
+    """Check if nobody has registered this email"""
+    index = _current_index()
+    if index is not None and email not in index.emails:
+        return True
+    return db.session.query(User.id).filter_by(email=email).first() is None
+
+
+def add(username=None, email=None):
+    """Record a newly taken username and/or email"""
+    index = _index
+    if index is not None:
+        index.add(username, email)
+
+
+def init_app(app):
+    """Start filling the filters in the background"""
+    if app.config['AVAILABILITY_FILTER_ENABLED']:
+        _start_build(app)
@@ -0,0 +1,110 @@
+"""
+Checkout throughput benchmark for Online Bookstore
+Concurrent customers each fill a cart, open checkout (placing their holds)
+and place the order, repeatedly; once with every checkout committing its
+own order and once with the group-commit order writer. Reports orders/sec,
+failed checkouts and the latency percentiles of the order POST
+
+Usage: python benchmarks/checkout_throughput.py [--threads 16] [--orders 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, basedir)
+
+from app import create_app
+from config import Config
+from models import db, User, Book
+
+CHECKOUT_FORM = {
+    'shipping_address': 'Benchmark Street 1, Kathmandu', 'shipping_city': 'Kathmandu',
+    'shipping_postal_code': '44600', 'shipping_phone': '9841234567', 'payment_method': 'Cash on Delivery',
+}
+
+
+def make_app(tmpdir, writer):
+    """App on a scratch database, with limits that would skew the numbers turned off"""
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmpdir, 'bench.db')
+        CATALOG_SNAPSHOT_PATH = os.path.join(tmpdir, 'catalog_snapshot.bin')
+        JINJA_BYTECODE_CACHE_DIR = os.path.join(tmpdir, 'jinja_cache')
+        WTF_CSRF_ENABLED = False
+        RATELIMIT_ENABLED = False
+        RESERVATION_SWEEPER_ENABLED = False
+        WARMUP_ENABLED = False
+        PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+        PASSWORD_HASH_WORKERS = 0
+        ORDER_WRITER_ENABLED = writer
+
+    return create_app(BenchConfig)
+
+
+def run(app, users, orders):
+    """Run every customer's checkouts, returning (orders/sec, failures, POST latencies in ms)"""
+    latencies = []
+    failures = []
+
+    def customer(username, book_id):
+        client = app.test_client()
+        client.post('/login', data={'username': username, 'password': 'password123'})
+        for _ in range(orders):
+            client.post(f'/add_to_cart/{book_id}', data={'quantity': 1})
+            client.get('/checkout')
+            start = time.perf_counter()
+            response = client.post('/checkout', data=CHECKOUT_FORM)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if '/order_confirmation/' not in response.headers.get('Location', ''):
+                failures.append(response.status_code)
+
+    threads = [threading.Thread(target=customer, args=(username, i % 50 + 1))
+               for i, username in enumerate(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return (len(latencies) - len(failures)) / elapsed, len(failures), sorted(latencies)
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16, help='concurrent customers')
+    parser.add_argument('--orders', type=int, default=20, help='orders per customer')
+    args = parser.parse_args()
+
+    for label, writer in [('per-request commit', False), ('group-commit writer', True)]:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            app = make_app(tmpdir, writer)
+            with app.app_context():
+                db.create_all()
+                for i in range(args.threads):
+                    user = User(username=f'bench{i}', email=f'bench{i}@example.com', full_name=f'Bench {i}')
+                    user.set_password('password123')
+                    db.session.add(user)
+                for i in range(50):
+                    db.session.add(Book(title=f'Book {i}', author='Author', isbn=f'{i:013d}',
+                                        price=100 + i, stock_quantity=1_000_000, category='Fiction'))
+                db.session.commit()
+
+            throughput, failures, latencies = run(app, [f'bench{i}' for i in range(args.threads)], args.orders)
+            print(f'{label}:')
+            print(f'  orders/sec            {throughput:8.1f}')
+            print(f'  failed checkouts      {failures:8d}')
+            print(f'  p50 / p95 / p99       {statistics.median(latencies):8.1f} / '
+                  f'{percentile(latencies, 0.95):.1f} / {percentile(latencies, 0.99):.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Login throughput benchmark for Online Bookstore
+Fires concurrent logins while a separate client keeps browsing the catalog,
+once with password hashing on the request threads and once in the process
+pool, and reports logins/sec and catalog latency for both
+
+Usage: python benchmarks/login_throughput.py [--threads N] [--logins N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, basedir)
+
+from app import create_app
+from config import Config
+from models import db, User, Book
+import hashing
+
+
+def make_app(tmpdir, workers):
+    """App writing only to tmpdir, with limits that would skew the numbers turned off"""
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmpdir, 'bench.db')
+        CATALOG_SNAPSHOT_PATH = os.path.join(tmpdir, 'catalog_snapshot.bin')
+        JINJA_BYTECODE_CACHE_DIR = os.path.join(tmpdir, 'jinja_cache')
+        PROFILER_DIR = os.path.join(tmpdir, 'profiles')
+        SITEMAP_DIR = os.path.join(tmpdir, 'sitemaps')
+        WARMUP_ENABLED = False
+        WTF_CSRF_ENABLED = False
+        RATELIMIT_ENABLED = False
+        RESERVATION_SWEEPER_ENABLED = False
+        PASSWORD_HASH_WORKERS = workers
+
+    return create_app(BenchConfig)
+
+
+def run(app, users, threads, logins):
+    """Run the login burst and return (logins/sec, catalog latencies in ms)"""
+    done = threading.Event()
+    latencies = []
+
+    def login_worker(index):
+        client = app.test_client()
+        for i in range(logins):
+            username = users[(index + i) % len(users)]
+            client.post('/login', data={'username': username, 'password': 'password123'})
+            client.get('/logout')
+
+    def catalog_worker():
+        client = app.test_client()
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get('/books')
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    browser = threading.Thread(target=catalog_worker)
+    workers = [threading.Thread(target=login_worker, args=(i,)) for i in range(threads)]
+
+    browser.start()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    browser.join()
+
+    return threads * logins / elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8, help='concurrent login clients')
+    parser.add_argument('--logins', type=int, default=10, help='logins per client')
+    parser.add_argument('--users', type=int, default=20, help='user accounts to create')
+    parser.add_argument('--hash-workers', type=int, default=Config.PASSWORD_HASH_WORKERS,
+                        help='processes in the hashing pool')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        setup = make_app(tmpdir, args.hash_workers)
+        with setup.app_context():
+            db.create_all()
+            for i in range(args.users):
+                user = User(username=f'bench{i}', email=f'bench{i}@example.com', full_name=f'Bench {i}')
+                user.set_password('password123')
+                db.session.add(user)
+            for i in range(50):
+                db.session.add(Book(title=f'Book {i}', author='Author', isbn=f'{i:013d}',
+                                    price=100 + i, stock_quantity=10, category='Fiction'))
+            db.session.commit()
+        users = [f'bench{i}' for i in range(args.users)]
+
+        for label, workers in [('request thread', 0), (f'process pool ({args.hash_workers})', args.hash_workers)]:
+            app = make_app(tmpdir, workers)
+            throughput, latencies = run(app, users, args.threads, args.logins)
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+            print(f'Hashing on {label}:')
+            print(f'  logins/sec            {throughput:8.1f}')
+            print(f'  catalog p50 / p95     {statistics.median(latencies) if latencies else 0:8.1f} / {p95:.1f} ms')
+        hashing.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Order archive benchmark for Online Bookstore
+Grows the order history step by step and times the hot-table queries used
+by dashboard() and the admin pages, with and without archiving, to show
+that archived history no longer slows them down
+
+Usage: python benchmarks/order_archive.py [--sizes 10000 50000 100000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, basedir)
+
+from app import create_app
+from config import Config
+from models import db, User, Book, Order, OrderItem
+import archive
+
+USERS = 200
+RECENT_ORDERS = 500
+
+
+def hot_queries(user_id):
+    """The order queries behind dashboard() and the admin dashboard"""
+    archive.order_history(user_id)
+    Order.query.count()
+    Order.query.filter_by(status='Pending').count()
+    Order.query.order_by(Order.order_date.desc()).limit(10).all()
+    db.session.remove()
+
+
+def time_queries(repeats=20):
+    """Median time of one round of hot queries in milliseconds"""
+    timings = []
+    for _ in range(repeats):
+        user_id = random.randint(1, USERS)
+        start = time.perf_counter()
+        hot_queries(user_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def add_orders(count, first_id, old):
+    """Bulk insert orders with two items each"""
+    now = datetime.utcnow()
+    orders, items = [], []
+    for order_id in range(first_id, first_id + count):
+        age = timedelta(days=random.randint(200, 2000)) if old else timedelta(hours=random.randint(1, 48))
+        orders.append({
+            'id': order_id, 'user_id': random.randint(1, USERS), 'order_date': now - age,
+            'total_amount': 1000.0, 'status': random.choice(archive.FINISHED_STATUSES) if old else 'Pending',
+            'shipping_address': 'Benchmark Street 1', 'payment_method': 'Cash on Delivery',
+        })
+        for n in range(2):
+            items.append({'id': order_id * 2 + n, 'order_id': order_id, 'book_id': n + 1,
+                          'quantity': 1, 'price': 500.0})
+    db.session.execute(db.insert(Order), orders)
+    db.session.execute(db.insert(OrderItem), items)
+    db.session.commit()
+
+
+def run(sizes, archived):
+    """Grow history to each size, returning (size, median ms) pairs"""
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmpdir, 'bench.db')
+
+        app = create_app(BenchConfig, with_routes=False)
+        with app.app_context():
+            db.create_all()
+            db.session.execute(db.insert(User), [
+                {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com',
+                 'password_hash': 'x', 'role': 'user'} for i in range(1, USERS + 1)])
+            db.session.execute(db.insert(Book), [
+                {'id': i, 'title': f'Book {i}', 'author': 'Author', 'isbn': f'{i:013d}',
+                 'price': 500.0, 'stock_quantity': 10, 'category': 'Fiction'} for i in (1, 2)])
+            db.session.commit()
+
+            # Old history below the recent orders' ids, so the newest order is always recent
+            add_orders(RECENT_ORDERS, 10_000_000, old=False)
+            total = 0
+            for size in sizes:
+                add_orders(size - total, total + 1, old=True)
+                total = size
+                if archived:
+                    archive.archive_orders(days=90, batch_size=5000)
+                results.append((size, time_queries()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000, 100000],
+                        help='total historical orders to grow to')
+    args = parser.parse_args()
+
+    plain = run(args.sizes, archived=False)
+    archived = run(args.sizes, archived=True)
+
+    print(f'{"history":>10} {"no archive":>12} {"archived":>12}')
+    for (size, plain_ms), (_, archived_ms) in zip(plain, archived):
+        print(f'{size:>10} {plain_ms:>10.2f}ms {archived_ms:>10.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Listing projection benchmark for Online Bookstore
+Renders a 100-book admin listing page from full Book entities, from
+entities with the description deferred, and from BookSummary projections,
+and reports the median latency and peak Python memory of each
+
+Usage: python benchmarks/projections.py [--books 5000] [--description-size 4000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, basedir)
+
+from flask import render_template
+
+from app import create_app
+from config import Config
+from models import db, Book
+from projections import book_summaries
+
+PAGE_SIZE = 100
+
+QUERIES = {
+    'entities': lambda: Book.query.options(db.undefer(Book.description)),
+    'entities, deferred description': lambda: Book.query,
+    'projections': book_summaries,
+}
+
+
+def render_page(make_query, page):
+    """Query and render one page of admin_books.html, as admin_books() does"""
+    pagination = make_query().order_by(Book.created_at.desc()) \
+        .paginate(page=page, per_page=PAGE_SIZE, error_out=False)
+    html = render_template('admin_books.html', books=pagination)
+    db.session.remove()
+    return html
+
+
+def measure(app, make_query, repeats):
+    """(median ms, peak KiB) of rendering a page"""
+    pages = max(1, Book.query.count() // PAGE_SIZE)
+    with app.test_request_context('/admin/books'):
+        render_page(make_query, 1)  # compile the template
+
+        timings = []
+        for n in range(repeats):
+            start = time.perf_counter()
+            render_page(make_query, n % pages + 1)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        tracemalloc.start()
+        render_page(make_query, 1)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return statistics.median(timings), peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--books', type=int, default=5000, help='books in the catalog')
+    parser.add_argument('--description-size', type=int, default=4000, help='characters per description')
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmpdir, 'bench.db')
+            CATALOG_SNAPSHOT_PATH = os.path.join(tmpdir, 'catalog.snapshot')
+            RESERVATION_SWEEPER_ENABLED = False
+            AVAILABILITY_FILTER_ENABLED = False
+            JINJA_BYTECODE_CACHE_DIR = os.path.join(tmpdir, 'jinja_cache')
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            description = 'Lorem ipsum dolor sit amet. ' * (args.description_size // 28)
+            db.session.execute(db.insert(Book), [
+                {'id': i, 'title': f'Book {i}', 'author': f'Author {i % 300}', 'isbn': f'{i:013d}',
+                 'price': 100.0 + i % 900, 'stock_quantity': i % 20, 'category': 'Fiction',
+                 'description': description, 'rating': i % 50 / 10} for i in range(1, args.books + 1)])
+            db.session.commit()
+
+            print(f'{PAGE_SIZE}-book page, {args.books} books, {args.description_size}-character descriptions')
+            print(f'{"loaded as":<32} {"median":>10} {"peak memory":>14}')
+            for name, make_query in QUERIES.items():
+                median, peak = measure(app, make_query, args.repeats)
+                print(f'{name:<32} {median:>8.2f}ms {peak:>10.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
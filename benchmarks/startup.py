@@ -0,0 +1,89 @@
+"""
+Startup benchmark for Online Bookstore
+Measures cold import time, app creation time, first-request latency and
+worker memory footprint, each in a fresh Python process
+
+Usage: python benchmarks/startup.py [--runs N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Runs inside a fresh interpreter so nothing is already imported or cached
+WORKER = '''
+import json, os, resource, sys, time
+sys.path.insert(0, {basedir!r})
+
+start = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+
+from config import Config
+
+# Everything the app writes goes to the benchmark's temporary directory
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join({tmpdir!r}, 'bench.db')
+    CATALOG_SNAPSHOT_PATH = os.path.join({tmpdir!r}, 'catalog_snapshot.bin')
+    JINJA_BYTECODE_CACHE_DIR = os.path.join({tmpdir!r}, 'jinja_cache')
+    PROFILER_DIR = os.path.join({tmpdir!r}, 'profiles')
+    SITEMAP_DIR = os.path.join({tmpdir!r}, 'sitemaps')
+    WARMUP_ENABLED = False
+
+config_loaded = time.perf_counter()
+app = app_module.create_app(BenchConfig)
+created = time.perf_counter()
+
+from models import db
+with app.app_context():
+    db.create_all()
+
+client = app.test_client()
+request_start = time.perf_counter()
+response = client.get('/')
+first_request = time.perf_counter()
+
+print(json.dumps({{
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - config_loaded) * 1000,
+    'first_request_ms': (first_request - request_start) * 1000,
+    'status': response.status_code,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+'''
+
+
+def run_once(tmpdir):
+    """Start one cold worker process and return its measurements"""
+    output = subprocess.run(
+        [sys.executable, '-c', WORKER.format(basedir=basedir, tmpdir=tmpdir)],
+        cwd=basedir, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='number of cold starts to measure')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = [run_once(tmpdir) for _ in range(args.runs)]
+
+    print(f'Cold starts: {args.runs}')
+    for key, label in [('import_ms', 'Import app module'),
+                       ('create_app_ms', 'create_app()'),
+                       ('first_request_ms', 'First request (GET /)'),
+                       ('max_rss_mb', 'Worker peak RSS')]:
+        values = [result[key] for result in results]
+        unit = 'MB' if key.endswith('_mb') else 'ms'
+        print(f'  {label:<24} median {statistics.median(values):8.1f} {unit}   max {max(values):8.1f} {unit}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+"""
+Blueprints for Online Bookstore
+Each area of the site lives in its own module and is only imported when an
+application is created, so importing the app module itself stays cheap
+"""
+from importlib import import_module
+
+# (module, blueprint attribute) for every area of the site
+BLUEPRINTS = [
+    ('blueprints.catalog', 'catalog_bp'),
+    ('blueprints.cart', 'cart_bp'),
+    ('blueprints.account', 'account_bp'),
+    ('blueprints.admin', 'admin_bp'),
+]
+
+
+def register_blueprints(app):
+    """Import and register every blueprint on the app"""
+    for module_name, attribute in BLUEPRINTS:
+        blueprint = getattr(import_module(module_name), attribute)
+        app.register_blueprint(blueprint)
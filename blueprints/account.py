@@ -0,0 +1,164 @@
+"""
+Account blueprint for Online Bookstore
+Registration, login/logout, user dashboard and profile
+"""
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify
+from flask_login import login_user, logout_user, login_required, current_user
+from sqlalchemy.exc import IntegrityError
+
+from models import db, User, ORDER_SUMMARY_TITLES
+from forms import RegistrationForm, LoginForm, ProfileForm
+from rate_limit import rate_limited
+import archive
+import availability
+
+account_bp = Blueprint('account', __name__)
+
+# USER REGISTRATION
+@account_bp.route('/register', methods=['GET', 'POST'])
+def register():
+    """User registration page"""
+    # Redirect if already logged in
+    if current_user.is_authenticated:
+        return redirect(url_for('catalog.index'))
+    
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        # Create new user
+        user = User(
+            username=form.username.data,
+            email=form.email.data,
+            full_name=form.full_name.data,
+            phone=form.phone.data
+        )
+        user.set_password(form.password.data)
+        
+        # Save to database; the unique constraints catch a name taken by a
+        # concurrent registration after the form was validated
+        db.session.add(user)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash('That username or email was just taken. Please choose another.', 'danger')
+            return render_template('register.html', form=form)
+        availability.add(user.username, user.email)
+        
+        flash('Registration successful! Please log in.', 'success')
+        return redirect(url_for('account.login'))
+    
+    return render_template('register.html', form=form)
+
+# USERNAME / EMAIL AVAILABILITY (live check on the registration form)
+@account_bp.route('/register/availability')
+@rate_limited('availability')
+def check_availability():
+    """Tell whether a username and/or email is still free"""
+    result = {}
+    username = request.args.get('username', '').strip()
+    email = request.args.get('email', '').strip()
+    if username:
+        result['username'] = {'value': username, 'available': availability.username_available(username)}
+    if email:
+        result['email'] = {'value': email, 'available': availability.email_available(email)}
+    return jsonify(result)
+
+# USER LOGIN
+@account_bp.route('/login', methods=['GET', 'POST'])
+@rate_limited('login', when=lambda: request.method == 'POST')
+def login():
+    """User login page"""
+    # Redirect if already logged in
+    if current_user.is_authenticated:
+        return redirect(url_for('catalog.index'))
+    
+    form = LoginForm()
+    if form.validate_on_submit():
+        # Find user by username
+        user = User.query.filter_by(username=form.username.data).first()
+        
+        # Check if user exists and password is correct
+        if user and user.check_password(form.password.data):
+            # Upgrade hashes made with outdated parameters while we have the password
+            if user.password_needs_rehash():
+                user.set_password(form.password.data)
+                db.session.commit()
+            
+            login_user(user)
+            flash(f'Welcome back, {user.username}!', 'success')
+            
+            # Redirect to next page or home
+            next_page = request.args.get('next')
+            return redirect(next_page) if next_page else redirect(url_for('catalog.index'))
+        else:
+            flash('Invalid username or password. Please try again.', 'danger')
+    
+    return render_template('login.html', form=form)
+
+# USER LOGOUT
+@account_bp.route('/logout')
+@login_required
+def logout():
+    """Log out current user"""
+    logout_user()
+    flash('You have been logged out successfully.', 'info')
+    return redirect(url_for('catalog.index'))
+
+# USER DASHBOARD
+@account_bp.route('/dashboard')
+@login_required
+def dashboard():
+    """User dashboard with profile and order history"""
+    # Get the first page of the user's orders, archived ones only when the
+    # full history is requested; further pages load as the user asks for them
+    show_history = request.args.get('history', type=int) == 1
+    orders, has_next = archive.order_history(
+        current_user.id, per_page=current_app.config['ORDERS_PER_PAGE'], include_archived=show_history
+    )
+    archived_orders = 0 if show_history else archive.archived_count(current_user.id)
+    
+    return render_template('dashboard.html', orders=orders, has_next=has_next, page=1,
+                           show_history=show_history, archived_orders=archived_orders,
+                           summary_titles=ORDER_SUMMARY_TITLES)
+
+# USER ORDER HISTORY PAGE
+@account_bp.route('/dashboard/orders')
+@login_required
+def dashboard_orders():
+    """Further pages of the order history, as an HTML fragment for the dashboard"""
+    page = request.args.get('page', 1, type=int)
+    show_history = request.args.get('history', type=int) == 1
+    orders, has_next = archive.order_history(
+        current_user.id, page=page, per_page=current_app.config['ORDERS_PER_PAGE'],
+        include_archived=show_history
+    )
+    
+    return render_template('_order_cards.html', orders=orders, has_next=has_next, page=page,
+                           show_history=show_history, summary_titles=ORDER_SUMMARY_TITLES)
+
+# UPDATE PROFILE
+@account_bp.route('/profile', methods=['GET', 'POST'])
+@login_required
+def profile():
+    """Update user profile"""
+    form = ProfileForm()
+    
+    if form.validate_on_submit():
+        current_user.full_name = form.full_name.data
+        current_user.email = form.email.data
+        current_user.phone = form.phone.data
+        current_user.address = form.address.data
+        
+        db.session.commit()
+        availability.add(email=current_user.email)
+        flash('Profile updated successfully!', 'success')
+        return redirect(url_for('account.dashboard'))
+    
+    # Pre-fill form
+    elif request.method == 'GET':
+        form.full_name.data = current_user.full_name
+        form.email.data = current_user.email
+        form.phone.data = current_user.phone
+        form.address.data = current_user.address
+    
+    return render_template('profile.html', form=form)
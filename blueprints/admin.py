@@ -0,0 +1,381 @@
+"""
+Admin blueprint for Online Bookstore
+Statistics dashboard, book management and order management
+"""
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_from_directory, abort
+from flask_login import login_required, current_user
+from werkzeug.utils import secure_filename
+import os
+from datetime import datetime
+
+from models import db, User, Book, Order
+from forms import BookForm, BulkCsvForm, BulkAdjustForm, BatchStatusForm
+import catalog_snapshot
+import archive
+import bulk_catalog
+import covers
+import order_status
+import profiler
+from projections import book_summaries
+from streaming import render_listing
+
+admin_bp = Blueprint('admin', __name__)
+
+# Helper function to check allowed file extensions
+def allowed_file(filename):
+    """Check if file extension is allowed"""
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
+
+# Helper function to read the requested page size of an admin listing
+def _per_page(default):
+    """Page size from the query string, capped at ADMIN_MAX_PER_PAGE"""
+    per_page = request.args.get('per_page', default, type=int)
+    return min(max(per_page, 1), current_app.config['ADMIN_MAX_PER_PAGE'])
+
+# ADMIN DASHBOARD
+@admin_bp.route('/admin')
+@login_required
+def admin_dashboard():
+    """Admin dashboard"""
+    if not current_user.is_admin():
+        flash('Access denied. Admin privileges required.', 'danger')
+        return redirect(url_for('catalog.index'))
+    
+    # Get statistics
+    total_books = Book.query.count()
+    total_users = User.query.filter_by(role='user').count()
+    total_orders = Order.query.count() + archive.archived_count()
+    pending_orders = Order.query.filter_by(status='Pending').count()
+    
+    # Get recent orders
+    recent_orders = Order.query.order_by(Order.order_date.desc()).limit(10).all()
+    
+    return render_template('admin.html', 
+                         total_books=total_books,
+                         total_users=total_users,
+                         total_orders=total_orders,
+                         pending_orders=pending_orders,
+                         recent_orders=recent_orders)
+
+# MANAGE BOOKS (Admin)
+@admin_bp.route('/admin/books')
+@login_required
+def admin_books():
+    """View all books (Admin)"""
+    if not current_user.is_admin():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('catalog.index'))
+    
+    page = request.args.get('page', 1, type=int)
+    per_page = _per_page(current_app.config['ADMIN_BOOKS_PER_PAGE'])
+    # Only the listed columns are loaded, as BookSummary tuples
+    query = book_summaries().order_by(Book.created_at.desc())
+    
+    return render_listing('admin_books.html', query, page, per_page, 'books')
+
+# ADD BOOK (Admin)
+@admin_bp.route('/admin/book/add', methods=['GET', 'POST'])
+@login_required
+def add_book():
+    """Add new book (Admin)"""
+    if not current_user.is_admin():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('catalog.index'))
+    
+    form = BookForm()
+    
+    if form.validate_on_submit():
+        # Handle file upload
+        cover_image = 'default_cover.jpg'
+        if form.cover_image.data:
+            file = form.cover_image.data
+            if file and allowed_file(file.filename):
+                filename = secure_filename(file.filename)
+                # Add timestamp to filename to make it unique
+                filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}"
+                file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+                covers.resize_upload(filename)
+                cover_image = filename
+        
+        # Create new book
+        book = Book(
+            title=form.title.data,
+            author=form.author.data,
+            isbn=form.isbn.data,
+            price=form.price.data,
+            stock_quantity=form.stock_quantity.data,
+            category=form.category.data,
+            description=form.description.data,
+            publisher=form.publisher.data,
+            publication_year=form.publication_year.data,
+            pages=form.pages.data,
+            language=form.language.data or 'English',
+            rating=form.rating.data or 0.0,
+            cover_image=cover_image
+        )
+        
+        db.session.add(book)
+        db.session.commit()
+        catalog_snapshot.publish()
+        
+        flash(f'Book "{book.title}" added successfully!', 'success')
+        return redirect(url_for('admin.admin_books'))
+    
+    return render_template('add_book.html', form=form)
+
+# EDIT BOOK (Admin)
+@admin_bp.route('/admin/book/edit/<int:book_id>', methods=['GET', 'POST'])
+@login_required
+def edit_book(book_id):
+    """Edit existing book (Admin)"""
+    if not current_user.is_admin():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('catalog.index'))
+    
+    book = Book.query.get_or_404(book_id)
+    form = BookForm()
+    
+    if form.validate_on_submit():
+        # Handle file upload
+        if form.cover_image.data:
+            file = form.cover_image.data
+            if file and allowed_file(file.filename):
+                filename = secure_filename(file.filename)
+                filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}"
+                file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+                covers.resize_upload(filename)
+                book.cover_image = filename
+        
+        # Update book details
+        book.title = form.title.data
+        book.author = form.author.data
+        book.isbn = form.isbn.data
+        book.price = form.price.data
+        book.stock_quantity = form.stock_quantity.data
+        book.category = form.category.data
+        book.description = form.description.data
+        book.publisher = form.publisher.data
+        book.publication_year = form.publication_year.data
+        book.pages = form.pages.data
+        book.language = form.language.data
+        book.rating = form.rating.data
+        
+        db.session.commit()
+        catalog_snapshot.publish()
+        
+        flash(f'Book "{book.title}" updated successfully!', 'success')
+        return redirect(url_for('admin.admin_books'))
+    
+    # Pre-fill form
+    elif request.method == 'GET':
+        form.title.data = book.title
+        form.author.data = book.author
+        form.isbn.data = book.isbn
+        form.price.data = book.price
+        form.stock_quantity.data = book.stock_quantity
+        form.category.data = book.category
+        form.description.data = book.description
+        form.publisher.data = book.publisher
+        form.publication_year.data = book.publication_year
+        form.pages.data = book.pages
+        form.language.data = book.language
+        form.rating.data = book.rating
+    
+    return render_template('edit_book.html', form=form, book=book)
+
+# DELETE BOOK (Admin)
+@admin_bp.route('/admin/book/delete/<int:book_id>', methods=['POST'])
+@login_required
+def delete_book(book_id):
+    """Delete book (Admin)"""
+    if not current_user.is_admin():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('catalog.index'))
+    
+    book = Book.query.get_or_404(book_id)
+    
+    db.session.delete(book)
+    db.session.commit()
+    catalog_snapshot.publish()
+    
+    flash(f'Book "{book.title}" deleted successfully.', 'info')
+    return redirect(url_for('admin.admin_books'))
+
+# BULK BOOK CHANGES (Admin)
+@admin_bp.route('/admin/books/bulk')
+@login_required
+def bulk_books():
+    """Bulk price and stock changes (Admin)"""
+    if not current_user.is_admin():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('catalog.index'))
+    
+    return render_template('admin_bulk_books.html', csv_form=BulkCsvForm(), adjust_form=BulkAdjustForm())
+
+# BULK CHANGES FROM CSV (Admin)
+@admin_bp.route('/admin/books/bulk/csv', methods=['POST'])
+@login_required
+def bulk_books_csv():
+    """Preview or apply a CSV of isbn/price/stock changes (Admin)"""
+    if not current_user.is_admin():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('catalog.index'))
+    
+    csv_form = BulkCsvForm()
+    result = None
+    
+    if csv_form.validate_on_submit():
+        # An uploaded file replaces the pasted text, and is kept there so
+        # "Apply Changes" after a preview doesn't need a second upload
+        if csv_form.csv_file.data:
+            csv_form.csv_text.data = csv_form.csv_file.data.read().decode('utf-8-sig', errors='replace')
+        try:
+            rows = bulk_catalog.parse_csv(csv_form.csv_text.data)
+        except bulk_catalog.CsvError as error:
+            csv_form.csv_text.errors = list(error.errors)
+        else:
+            result = bulk_catalog.apply_csv(rows, dry_run=not csv_form.apply.data)
+            if result.applied:
+                flash(f'Updated {result.matched} books.', 'success')
+                return redirect(url_for('admin.admin_books'))
+    
+    return render_template('admin_bulk_books.html', csv_form=csv_form, adjust_form=BulkAdjustForm(formdata=None),
+                           result=result, source='csv')
+
+# BULK PRICE CHANGE / RESTOCK (Admin)
+@admin_bp.route('/admin/books/bulk/adjust', methods=['POST'])
+@login_required
+def bulk_books_adjust():
+    """Preview or apply a price change and/or restock of a category or publisher (Admin)"""
+    if not current_user.is_admin():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('catalog.index'))
+    
+    adjust_form = BulkAdjustForm()
+    result = None
+    
+    if adjust_form.validate_on_submit():
+        result = bulk_catalog.apply_adjustment(
+            category=adjust_form.category.data,
+            publisher=(adjust_form.publisher.data or '').strip(),
+            percent=adjust_form.percent.data,
+            restock=adjust_form.restock.data,
+            dry_run=not adjust_form.apply.data,
+        )
+        if result.applied:
+            flash(f'Updated {result.matched} books.', 'success')
+            return redirect(url_for('admin.admin_books'))
+    
+    return render_template('admin_bulk_books.html', csv_form=BulkCsvForm(formdata=None), adjust_form=adjust_form,
+                           result=result, source='adjust')
+
+# MANAGE ORDERS (Admin)
+@admin_bp.route('/admin/orders')
+@login_required
+def admin_orders():
+    """View all orders (Admin)"""
+    if not current_user.is_admin():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('catalog.index'))
+    
+    page = request.args.get('page', 1, type=int)
+    per_page = _per_page(current_app.config['ORDERS_PER_PAGE'])
+    # Customers are joined in so large pages don't load them one by one
+    query = Order.query.join(Order.customer).options(db.contains_eager(Order.customer)) \
+        .order_by(Order.order_date.desc())
+    
+    return render_listing('admin_orders.html', query, page, per_page, 'orders',
+                          batch_form=BatchStatusForm(), statuses=order_status.STATUSES,
+                          allowed_from=order_status.ALLOWED_FROM)
+
+# UPDATE ORDER STATUS (Admin)
+@admin_bp.route('/admin/order/update/<int:order_id>', methods=['POST'])
+@login_required
+def update_order_status(order_id):
+    """Update order status (Admin)"""
+    if not current_user.is_admin():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('catalog.index'))
+    
+    order = Order.query.get_or_404(order_id)
+    new_status = request.form.get('status')
+    
+    if new_status in order_status.STATUSES and new_status != order.status:
+        # Same transition rules and history as batch changes
+        try:
+            result = order_status.change_status(new_status, [order.id], changed_by=current_user.id)
+        except order_status.TransitionError as error:
+            flash(str(error) + '.', 'danger')
+        else:
+            if result.changed:
+                flash(f'Order #{order.id} status updated to {new_status}.', 'success')
+            else:
+                flash(f'{order.status} orders can\'t be moved to {new_status}.', 'warning')
+    
+    return redirect(url_for('admin.admin_orders'))
+
+# BATCH ORDER STATUS (Admin)
+@admin_bp.route('/admin/orders/status', methods=['POST'])
+@login_required
+def batch_order_status():
+    """Move the selected or listed orders, or all orders matching the filters, to a new status (Admin)"""
+    if not current_user.is_admin():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('catalog.index'))
+    
+    form = BatchStatusForm()
+    if not form.validate_on_submit():
+        for errors in form.errors.values():
+            flash(errors[0], 'danger')
+        return redirect(url_for('admin.admin_orders'))
+    
+    # Ids ticked in the listing plus any typed in
+    order_ids = [int(order_id) for order_id in request.form.getlist('selected') if order_id.isdigit()]
+    order_ids = list(dict.fromkeys(order_ids + order_status.parse_ids(form.order_ids.data)))
+    placed_before = datetime.combine(form.placed_before.data, datetime.min.time()) \
+        if form.placed_before.data else None
+    if not order_ids and not form.from_status.data and not placed_before:
+        flash('Select orders, list their ids or choose a current status or date.', 'warning')
+        return redirect(url_for('admin.admin_orders'))
+    
+    try:
+        result = order_status.change_status(
+            form.to_status.data,
+            order_ids=order_ids or None,
+            from_status=form.from_status.data or None,
+            placed_before=placed_before,
+            changed_by=current_user.id,
+        )
+    except order_status.TransitionError as error:
+        flash(str(error), 'danger')
+        return redirect(url_for('admin.admin_orders'))
+    
+    flash(result.summary() + '.', 'success' if result.changed else 'warning')
+    return redirect(url_for('admin.admin_orders'))
+
+# REQUEST PROFILES (Admin)
+@admin_bp.route('/admin/profiles')
+@login_required
+def admin_profiles():
+    """Slowest captured request profiles per endpoint (Admin)"""
+    if not current_user.is_admin():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('catalog.index'))
+    
+    return render_template('admin_profiles.html',
+                         profiles=profiler.slowest_profiles(),
+                         token=profiler.make_token(current_user.id))
+
+# DOWNLOAD PROFILE FILE (Admin)
+@admin_bp.route('/admin/profiles/<path:filename>')
+@login_required
+def download_profile(filename):
+    """Download a .prof or .folded profile file (Admin)"""
+    if not current_user.is_admin():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('catalog.index'))
+    
+    if not filename.endswith(('.prof', '.folded')):
+        abort(404)
+    return send_from_directory(current_app.config['PROFILER_DIR'], filename, as_attachment=True)
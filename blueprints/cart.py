@@ -0,0 +1,187 @@
+"""
+Cart blueprint for Online Bookstore
+Shopping cart kept in the session, checkout and order confirmation
+"""
+from flask import Blueprint, render_template, redirect, url_for, flash, request, session, abort
+from flask_login import login_required, current_user
+
+from models import db, Book
+from forms import CheckoutForm
+import reservations
+from rate_limit import rate_limited
+import archive
+import metrics
+import order_writer
+
+cart_bp = Blueprint('cart', __name__)
+
+# SHOPPING CART
+@cart_bp.route('/cart')
+def cart():
+    """Display shopping cart"""
+    # Get cart from session
+    cart = session.get('cart', {})
+    cart_items = []
+    total = 0
+    
+    # Get book details for each item in cart
+    for book_id, quantity in cart.items():
+        book = Book.query.get(int(book_id))
+        if book:
+            subtotal = book.price * quantity
+            cart_items.append({
+                'book': book,
+                'quantity': quantity,
+                'subtotal': subtotal
+            })
+            total += subtotal
+    
+    return render_template('cart.html', cart_items=cart_items, total=total)
+
+# ADD TO CART
+@cart_bp.route('/add_to_cart/<int:book_id>', methods=['POST'])
+@rate_limited('add_to_cart')
+def add_to_cart(book_id):
+    """Add book to shopping cart"""
+    book = Book.query.get_or_404(book_id)
+    quantity = int(request.form.get('quantity', 1))
+    
+    # Check stock availability (copies held by other checkouts are not for sale)
+    user_id = current_user.id if current_user.is_authenticated else None
+    available = reservations.available_stock(book, user_id)
+    if quantity > available:
+        flash(f'Only {available} copies available in stock.', 'warning')
+        return redirect(url_for('catalog.book_detail', book_id=book_id))
+    
+    # Get or create cart in session
+    cart = session.get('cart', {})
+    
+    # Add or update quantity
+    if str(book_id) in cart:
+        cart[str(book_id)] += quantity
+    else:
+        cart[str(book_id)] = quantity
+    
+    # Save cart to session
+    session['cart'] = cart
+    session.modified = True
+    metrics.CART_ADDS.inc()
+    
+    flash(f'{book.title} added to cart!', 'success')
+    return redirect(url_for('catalog.books'))
+
+# UPDATE CART
+@cart_bp.route('/update_cart/<int:book_id>', methods=['POST'])
+def update_cart(book_id):
+    """Update quantity in cart"""
+    quantity = int(request.form.get('quantity', 1))
+    
+    cart = session.get('cart', {})
+    
+    if quantity > 0:
+        cart[str(book_id)] = quantity
+    else:
+        cart.pop(str(book_id), None)
+    
+    session['cart'] = cart
+    session.modified = True
+    
+    # Cart changed, so any checkout holds no longer match it
+    if current_user.is_authenticated:
+        reservations.release_holds(current_user.id)
+        db.session.commit()
+    
+    flash('Cart updated successfully!', 'success')
+    return redirect(url_for('cart.cart'))
+
+# REMOVE FROM CART
+@cart_bp.route('/remove_from_cart/<int:book_id>')
+def remove_from_cart(book_id):
+    """Remove item from cart"""
+    cart = session.get('cart', {})
+    cart.pop(str(book_id), None)
+    
+    session['cart'] = cart
+    session.modified = True
+    
+    if current_user.is_authenticated:
+        reservations.release_holds(current_user.id)
+        db.session.commit()
+    
+    flash('Item removed from cart.', 'info')
+    return redirect(url_for('cart.cart'))
+
+# CHECKOUT
+@cart_bp.route('/checkout', methods=['GET', 'POST'])
+@login_required
+def checkout():
+    """Checkout and place order"""
+    # Get cart from session
+    cart = session.get('cart', {})
+    
+    if not cart:
+        flash('Your cart is empty!', 'warning')
+        return redirect(url_for('catalog.books'))
+    
+    form = CheckoutForm()
+    
+    # Hold the cart quantities (or renew the existing holds) so they cannot be
+    # sold to someone else while the form is being filled in
+    shortages = reservations.place_holds(current_user.id, cart)
+    if shortages:
+        metrics.OUT_OF_STOCK.inc()
+        for title in shortages:
+            flash(f'Insufficient stock for {title}', 'danger')
+        return redirect(url_for('cart.cart'))
+    
+    # Pre-fill form with user data
+    if request.method == 'GET':
+        form.shipping_address.data = current_user.address
+        form.shipping_phone.data = current_user.phone
+    
+    # Cart items come from the active holds
+    cart_items = reservations.held_items(current_user.id)
+    total = sum(item['subtotal'] for item in cart_items)
+    
+    if form.validate_on_submit():
+        # Create the order from the holds (directly, or batched with other
+        # checkouts by the order writer)
+        intent = order_writer.OrderIntent(
+            user_id=current_user.id,
+            shipping_address=form.shipping_address.data,
+            shipping_city=form.shipping_city.data,
+            shipping_postal_code=form.shipping_postal_code.data,
+            shipping_phone=form.shipping_phone.data,
+            payment_method=form.payment_method.data
+        )
+        try:
+            order_id = order_writer.submit(intent)
+        except order_writer.OrderRejected as error:
+            flash(str(error), 'danger')
+            return redirect(url_for('cart.cart'))
+        metrics.ORDERS_PLACED.inc()
+        
+        # Clear cart
+        session['cart'] = {}
+        session.modified = True
+        
+        flash(f'Order #{order_id} placed successfully!', 'success')
+        return redirect(url_for('cart.order_confirmation', order_id=order_id))
+    
+    return render_template('checkout.html', form=form, cart_items=cart_items, total=total)
+
+# ORDER CONFIRMATION
+@cart_bp.route('/order_confirmation/<int:order_id>')
+@login_required
+def order_confirmation(order_id):
+    """Display order confirmation"""
+    order = archive.find_order(order_id)
+    if order is None:
+        abort(404)
+    
+    # Check if order belongs to current user
+    if order.user_id != current_user.id and not current_user.is_admin():
+        flash('Access denied.', 'danger')
+        return redirect(url_for('catalog.index'))
+    
+    return render_template('order_confirmation.html', order=order)
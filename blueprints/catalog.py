@@ -0,0 +1,115 @@
+"""
+Catalog blueprint for Online Bookstore
+Homepage, book listing with search and filters, and book details
+"""
+from flask import Blueprint, render_template, request, current_app
+
+from models import db, Book
+import catalog_snapshot
+import facets
+from projections import book_summaries, summaries_by_ids
+from rate_limit import rate_limited
+
+catalog_bp = Blueprint('catalog', __name__)
+
+# HOME PAGE
+@catalog_bp.route('/')
+@catalog_bp.route('/index')
+def index():
+    """Homepage with featured books and categories"""
+    snapshot = catalog_snapshot.get_snapshot()
+    
+    if snapshot:
+        # Sorted lists come from the shared snapshot, only the rows are loaded
+        featured_books = summaries_by_ids(snapshot.listing('bestselling', limit=8))
+        latest_books = summaries_by_ids(snapshot.listing('latest', limit=8))
+        categories = [(name,) for name in snapshot.categories]
+    else:
+        # Get featured books (bestselling over 30 days, highest rated first among equals)
+        featured_books = book_summaries().filter(Book.stock_quantity > 0) \
+            .order_by(Book.sales_30d.desc(), Book.sales_7d.desc(), Book.rating.desc()).limit(8).all()
+        
+        # Get latest books
+        latest_books = book_summaries().filter(Book.stock_quantity > 0).order_by(Book.created_at.desc()).limit(8).all()
+        
+        # Get all categories
+        categories = db.session.query(Book.category).distinct().all()
+    
+    return render_template('index.html', 
+                         featured_books=featured_books,
+                         latest_books=latest_books,
+                         categories=categories)
+
+# BOOKS CATALOG
+@catalog_bp.route('/books')
+@rate_limited('search', when=lambda: bool(request.args.get('query')))
+def books():
+    """Display all books with faceted filtering and search"""
+    # Get search parameters
+    search_query = request.args.get('query', '')
+    sort_by = request.args.get('sort', 'title')
+    page = request.args.get('page', 1, type=int)
+    per_page = current_app.config['BOOKS_PER_PAGE']
+    
+    # Facet filters: several values per facet (OR), facets combined with AND
+    selected = facets.selected_filters(request.args)
+    index = facets.get_index()
+    
+    # Text search still needs the database, its matches become a bitmap
+    search_bitmap = None
+    if search_query:
+        matches = db.session.query(Book.id).filter(
+            db.or_(
+                Book.title.ilike(f'%{search_query}%'),
+                Book.author.ilike(f'%{search_query}%'),
+                Book.isbn.ilike(f'%{search_query}%')
+            )
+        )
+        search_bitmap = index.ids_bitmap(row[0] for row in matches)
+    
+    # Sidebar counts for every facet value, from the bitmaps alone
+    facet_counts = index.counts(selected, search_bitmap)
+    
+    # Plain listings (in stock, at most one category, no search) are served
+    # from the shared snapshot, everything else from the facet bitmaps
+    plain = not search_query and len(selected['category']) <= 1 and selected['availability'] == ['in_stock'] \
+        and not any(selected[facet] for facet in ('language', 'decade', 'price'))
+    snapshot = catalog_snapshot.get_snapshot() if plain else None
+    if snapshot:
+        books_pagination = catalog_snapshot.SnapshotPagination(
+            page=page, per_page=per_page, error_out=False,
+            snapshot=snapshot, sort=sort_by, category=(selected['category'] or [None])[0]
+        )
+    else:
+        books_pagination = facets.FacetPagination(
+            page=page, per_page=per_page, error_out=False,
+            index=index, bitmap=index.filter(selected, search_bitmap), sort=sort_by
+        )
+    
+    # Current filters, repeated in the page links
+    filter_args = {key: request.args.getlist(key) for key in request.args if key != 'page'}
+    
+    return render_template('books.html', 
+                         books=books_pagination.items,
+                         pagination=books_pagination,
+                         facet_counts=facet_counts,
+                         facet_labels=facets.FACET_LABELS,
+                         filter_args=filter_args,
+                         search_query=search_query,
+                         sort_by=sort_by)
+
+# BOOK DETAILS
+@catalog_bp.route('/book/<int:book_id>')
+def book_detail(book_id):
+    """Display single book details"""
+    # The description is deferred on Book, this page is the one that shows it
+    book = Book.query.options(db.undefer(Book.description)).get_or_404(book_id)
+    
+    # Get related books from same category
+    related_books = book_summaries().filter(
+        Book.category == book.category,
+        Book.id != book.id,
+        Book.stock_quantity > 0
+    ).limit(4).all()
+    
+    return render_template('book_detail.html', book=book, related_books=related_books)
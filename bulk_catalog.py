@@ -0,0 +1,214 @@
+"""
+Bulk catalog changes for Online Bookstore
+Price and stock changes for many books at once: a CSV of isbn/price/stock
+rows, or a percentage price change and/or restock of every book in a
+category and/or from a publisher. Each change runs as one set-based UPDATE
+in a single transaction, and the catalog caches (snapshot, facet bitmaps)
+are refreshed once afterwards rather than once per book.
+
+A preview runs the same expressions as a SELECT, so it shows exactly what
+applying would write.
+"""
+import csv
+import io
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from models import db, Book
+
+books = Book.__table__
+
+# CSV rows are loaded into this per-connection table and joined in the UPDATE
+changes = db.Table(
+    'bulk_book_changes', db.MetaData(),
+    db.Column('isbn', db.String(13), primary_key=True),
+    db.Column('price', db.Float),
+    db.Column('stock', db.Integer),
+    prefixes=['TEMPORARY'],
+)
+
+
+class BulkResult:
+    """Outcome of a bulk change: the affected books and, for CSVs, unknown ISBNs"""
+
+    def __init__(self, matched, preview, unmatched=(), applied=False):
+        self.matched = matched
+        self.preview = preview  # (id, isbn, title, price, new_price, stock, new_stock), first BULK_PREVIEW_ROWS
+        self.unmatched = list(unmatched)
+        self.applied = applied
+
+
+class CsvError(ValueError):
+    """A CSV that can't be applied; errors lists the problems by line"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def parse_csv(text):
+    """
+    {isbn: (price, stock_delta)} from CSV text with an isbn column and price and/or stock columns
+    Empty cells leave that value unchanged; repeated ISBNs add up their stock deltas
+    """
+    reader = csv.DictReader(io.StringIO(text.lstrip('\ufeff')))
+    fields = [name.strip().lower() for name in reader.fieldnames or ()]
+    if 'isbn' not in fields or not {'price', 'stock'} & set(fields):
+        raise CsvError(['The header must have an isbn column and a price and/or stock column'])
+    reader.fieldnames = fields
+
+    rows = {}
+    errors = []
+    for row in reader:
+        line = reader.line_num
+        isbn = (row.get('isbn') or '').strip().replace('-', '')
+        if not isbn:
+            errors.append(f'Line {line}: missing isbn')
+            continue
+        price = stock = None
+        try:
+            if (row.get('price') or '').strip():
+                price = float(row['price'])
+                if price <= 0:
+                    raise ValueError
+        except ValueError:
+            errors.append(f'Line {line}: price must be a positive number')
+            continue
+        try:
+            if (row.get('stock') or '').strip():
+                stock = int(row['stock'])
+        except ValueError:
+            errors.append(f'Line {line}: stock must be a whole number (e.g. 10 or -3)')
+            continue
+
+        old_price, old_stock = rows.get(isbn, (None, None))
+        if stock is not None and old_stock is not None:
+            stock += old_stock
+        rows[isbn] = (price if price is not None else old_price,
+                      stock if stock is not None else old_stock)
+
+    if errors:
+        raise CsvError(errors)
+    if not rows:
+        raise CsvError(['The CSV has no rows'])
+    return rows
+
+
+def _not_negative(value):
+    return db.case((value < 0, 0), else_=value)
+
+
+def _preview(new_price, new_stock, *conditions, select_from=books):
+    """Count and first rows of the books matching conditions, with their new values"""
+    matched = db.session.execute(
+        db.select(db.func.count()).select_from(select_from).where(*conditions)
+    ).scalar()
+    rows = db.session.execute(
+        db.select(books.c.id, books.c.isbn, books.c.title, books.c.price, new_price,
+                  books.c.stock_quantity, new_stock)
+        .select_from(select_from).where(*conditions)
+        .order_by(books.c.title).limit(current_app.config['BULK_PREVIEW_ROWS'])
+    ).all()
+    return matched, rows
+
+
+def apply_csv(rows, dry_run=True):
+    """Set prices and add stock deltas from parse_csv() rows in one UPDATE ... FROM"""
+    connection = db.session.connection()
+    # A failed earlier run may have left the table on this pooled connection
+    changes.create(connection, checkfirst=True)
+    try:
+        connection.execute(changes.delete())
+        connection.execute(changes.insert(), [
+            {'isbn': isbn, 'price': price, 'stock': stock} for isbn, (price, stock) in rows.items()
+        ])
+        new_price = db.func.coalesce(changes.c.price, books.c.price)
+        new_stock = _not_negative(books.c.stock_quantity + db.func.coalesce(changes.c.stock, 0))
+        joined = books.join(changes, books.c.isbn == changes.c.isbn)
+        matched, preview = _preview(new_price, new_stock, select_from=joined)
+        unmatched = db.session.execute(
+            db.select(changes.c.isbn)
+            .where(~db.exists().where(books.c.isbn == changes.c.isbn))
+            .order_by(changes.c.isbn)
+        ).scalars().all()
+
+        if not dry_run:
+            db.session.execute(
+                books.update().where(books.c.isbn == changes.c.isbn)
+                .values(price=new_price, stock_quantity=new_stock)
+            )
+        changes.drop(connection)
+    except Exception:
+        db.session.rollback()
+        raise
+    return _finish(BulkResult(matched, preview, unmatched, applied=not dry_run))
+
+
+def apply_adjustment(category=None, publisher=None, percent=None, restock=None, dry_run=True):
+    """Change prices by percent and/or add restock units for every book matching the filters"""
+    conditions = []
+    if category:
+        conditions.append(books.c.category == category)
+    if publisher:
+        conditions.append(books.c.publisher == publisher)
+
+    new_price = books.c.price
+    if percent:
+        new_price = db.func.round(books.c.price * (1 + percent / 100.0), 2)
+    new_stock = books.c.stock_quantity + (restock or 0)
+
+    try:
+        matched, preview = _preview(new_price, new_stock, *conditions)
+        if not dry_run:
+            db.session.execute(
+                books.update().where(*conditions).values(price=new_price, stock_quantity=new_stock)
+            )
+    except Exception:
+        db.session.rollback()
+        raise
+    return _finish(BulkResult(matched, preview, applied=not dry_run))
+
+
+def _finish(result):
+    """Commit an applied change and refresh the catalog caches once"""
+    if not result.applied:
+        db.session.rollback()
+        return result
+
+    import catalog_snapshot
+    import facets
+
+    db.session.commit()
+    # Core UPDATEs bypass the ORM events that keep the facet bitmaps current
+    facets.invalidate()
+    catalog_snapshot.publish()
+    return result
+
+
+@click.command('bulk-update-books')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--apply', 'apply_changes', is_flag=True, help='Write the changes (default is a dry run)')
+@with_appcontext
+def bulk_update_books_command(csv_file, apply_changes):
+    """Set prices and adjust stock from a CSV of isbn,price,stock rows"""
+    try:
+        rows = parse_csv(csv_file.read())
+    except CsvError as error:
+        raise click.ClickException('\n'.join(error.errors))
+
+    result = apply_csv(rows, dry_run=not apply_changes)
+    for book_id, isbn, title, price, new_price, stock, new_stock in result.preview:
+        print(f'{isbn}  {title[:40]:40}  price {price} -> {new_price}  stock {stock} -> {new_stock}')
+    for isbn in result.unmatched:
+        print(f'{isbn}  not found')
+    if result.applied:
+        print(f'Updated {result.matched} books.')
+    else:
+        print(f'{result.matched} books would change. Run again with --apply to write them.')
+
+
+def init_app(app):
+    """Register the CLI command"""
+    app.cli.add_command(bulk_update_books_command)
@@ -0,0 +1,287 @@
+"""
+Shared catalog snapshot for Online Bookstore
+A compact, read-only column layout of the catalog (ids, prices, ratings,
+stock, category codes and precomputed sort orders) written to a file that
+every worker process memory-maps. The pages are shared by the OS, so the
+lists behind index() and books() are held once per machine instead of
+once per worker, and listing sorts need no database query.
+
+A new snapshot is written to a temporary file and swapped in with
+os.replace(), so readers always see either the old or the new version.
+A commit that sells a book out (or restocks one) through the ORM marks the
+snapshot stale, so the worker rebuilds it on its next listing.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Book
+from projections import summaries_by_ids
+
+MAGIC = b'BHSNAP02'
+# magic, version, book count, category count, category JSON length
+HEADER = struct.Struct('<8sQIII4x')
+
+# Sort orders stored in the snapshot, matching the books() sort options
+SORT_KEYS = ['title', 'price_asc', 'price_desc', 'rating', 'latest', 'bestselling']
+
+
+class CatalogSnapshot:
+    """A memory-mapped catalog snapshot, columns are zero-copy memoryviews"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.stat_key = _stat_key(path)
+
+        magic, self.version, count, category_count, json_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a catalog snapshot')
+
+        buffer = memoryview(self._mmap)
+        offset = HEADER.size
+
+        def column(fmt, size, length):
+            nonlocal offset
+            view = buffer[offset:offset + size * length].cast(fmt)
+            offset += size * length
+            return view
+
+        # 8-byte columns first so every column stays aligned
+        self.prices = column('d', 8, count)
+        self.ratings = column('d', 8, count)
+        self.ids = column('i', 4, count)
+        self.stock = column('i', 4, count)
+        self.category_codes = column('i', 4, count)
+        self.orders = {key: column('i', 4, count) for key in SORT_KEYS}
+        self.in_stock_counts = column('i', 4, category_count)
+        self.categories = json.loads(bytes(buffer[offset:offset + json_length]).decode('utf-8'))
+        self.category_index = {name: code for code, name in enumerate(self.categories)}
+
+    def count(self, category=None):
+        """Number of in-stock books, optionally within one category"""
+        if category is None:
+            return sum(self.in_stock_counts)
+        code = self.category_index.get(category)
+        return self.in_stock_counts[code] if code is not None else 0
+
+    def listing(self, sort='title', category=None, offset=0, limit=None):
+        """Return the ids of in-stock books in the requested order"""
+        order = self.orders.get(sort, self.orders['title'])
+        code = self.category_index.get(category, -1) if category else None
+        if code == -1:
+            return []
+
+        stock, codes, ids = self.stock, self.category_codes, self.ids
+        end = offset + limit if limit is not None else None
+        result = []
+        seen = 0
+        for row in order:
+            if stock[row] <= 0 or (code is not None and codes[row] != code):
+                continue
+            if seen >= offset:
+                result.append(ids[row])
+                if end is not None and seen + 1 >= end:
+                    break
+            seen += 1
+        return result
+
+
+class SnapshotPagination(Pagination):
+    """Pagination over a snapshot listing, usable by the books.html template"""
+
+    def _query_items(self):
+        snapshot = self._query_args['snapshot']
+        ids = snapshot.listing(self._query_args['sort'], self._query_args['category'],
+                               offset=self._query_offset, limit=self.per_page)
+        return summaries_by_ids(ids)
+
+    def _query_count(self):
+        return self._query_args['snapshot'].count(self._query_args['category'])
+
+
+def _stat_key(path):
+    """Identify a snapshot file version without reading it"""
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def build_snapshot(path):
+    """Write a fresh snapshot of the catalog and atomically swap it in"""
+    rows = db.session.query(
+        Book.id, Book.title, Book.price, Book.rating, Book.stock_quantity,
+        Book.category, Book.created_at, Book.sales_30d, Book.sales_7d
+    ).all()
+
+    categories = sorted({row.category for row in rows})
+    category_index = {name: code for code, name in enumerate(categories)}
+    in_stock_counts = [0] * len(categories)
+    for row in rows:
+        if row.stock_quantity > 0:
+            in_stock_counts[category_index[row.category]] += 1
+
+    positions = range(len(rows))
+    orders = {
+        'title': sorted(positions, key=lambda i: rows[i].title.lower()),
+        'price_asc': sorted(positions, key=lambda i: rows[i].price),
+        'price_desc': sorted(positions, key=lambda i: -rows[i].price),
+        'rating': sorted(positions, key=lambda i: -(rows[i].rating or 0)),
+        'latest': sorted(positions, key=lambda i: rows[i].created_at.timestamp() if rows[i].created_at else 0,
+                         reverse=True),
+        'bestselling': sorted(positions, key=lambda i: (rows[i].sales_30d or 0, rows[i].sales_7d or 0,
+                                                        rows[i].rating or 0), reverse=True),
+    }
+    category_json = json.dumps(categories).encode('utf-8')
+
+    count = len(rows)
+    parts = [
+        HEADER.pack(MAGIC, time.time_ns(), count, len(categories), len(category_json)),
+        struct.pack(f'<{count}d', *(row.price for row in rows)),
+        struct.pack(f'<{count}d', *(row.rating or 0 for row in rows)),
+        struct.pack(f'<{count}i', *(row.id for row in rows)),
+        struct.pack(f'<{count}i', *(row.stock_quantity for row in rows)),
+        struct.pack(f'<{count}i', *(category_index[row.category] for row in rows)),
+    ]
+    parts += [struct.pack(f'<{count}i', *orders[key]) for key in SORT_KEYS]
+    parts += [struct.pack(f'<{len(categories)}i', *in_stock_counts), category_json]
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b''.join(parts))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+# Per-process view of the shared snapshot
+_lock = threading.Lock()
+_current = None
+_checked_at = 0.0
+# Set when a commit moved a book in or out of stock (e.g. a checkout sold it out)
+_stale = False
+
+
+def get_snapshot():
+    """
+    Return the current snapshot for this worker, or None to fall back to the database
+    The file is re-checked at most every CATALOG_SNAPSHOT_CHECK_INTERVAL seconds and
+    re-mapped when another process has swapped in a new version
+    """
+    global _current, _checked_at, _stale
+    config = current_app.config
+    if not config['CATALOG_SNAPSHOT_ENABLED']:
+        return None
+
+    now = time.monotonic()
+    if _current is not None and not _stale and now - _checked_at < config['CATALOG_SNAPSHOT_CHECK_INTERVAL']:
+        return _current
+
+    with _lock:
+        _checked_at = now
+        path = config['CATALOG_SNAPSHOT_PATH']
+        try:
+            stat_key = _stat_key(path)
+            stale = _stale or time.time() - stat_key[1] / 1e9 > config['CATALOG_SNAPSHOT_MAX_AGE']
+        except FileNotFoundError:
+            stat_key, stale = None, True
+
+        # No refresher process has (recently) written one, or this process
+        # changed what is in stock, so build it here
+        if stale:
+            # Cleared first, so a sale committed during the build marks it again
+            _stale = False
+            try:
+                build_snapshot(path)
+                stat_key = _stat_key(path)
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception('Building the catalog snapshot failed')
+                if stat_key is None:
+                    return None
+
+        if _current is None or _current.stat_key != stat_key:
+            try:
+                _current = CatalogSnapshot(path)
+            except ValueError:
+                # Written by an older version with a different layout
+                build_snapshot(path)
+                _current = CatalogSnapshot(path)
+        return _current
+
+
+def mark_stale():
+    """Have the next get_snapshot() rebuild the file, which every worker then picks up"""
+    global _stale
+    _stale = True
+
+
+# ---- Stock changes made through the ORM ----
+
+def _after_flush(session, flush_context):
+    """Note Books whose stock went to zero or back above it (the snapshot lists in-stock books)"""
+    for instance in session.dirty:
+        if not isinstance(instance, Book):
+            continue
+        history = db.inspect(instance).attrs.stock_quantity.history
+        if history.added and history.deleted and \
+                (history.added[0] > 0) != (history.deleted[0] > 0):
+            session.info['snapshot_stale'] = True
+
+
+def _after_commit(session):
+    # Also fired when a savepoint is released; wait for the real commit
+    if session.in_nested_transaction():
+        return
+    if session.info.pop('snapshot_stale', False):
+        mark_stale()
+
+
+def _after_rollback(session, previous_transaction):
+    # A savepoint rollback keeps the changes of the enclosing transaction
+    if previous_transaction.nested:
+        return
+    session.info.pop('snapshot_stale', None)
+
+
+def publish():
+    """Rebuild the snapshot after a catalog write so every worker picks it up"""
+    global _checked_at
+    if current_app.config['CATALOG_SNAPSHOT_ENABLED']:
+        build_snapshot(current_app.config['CATALOG_SNAPSHOT_PATH'])
+        _checked_at = 0.0
+
+
+@click.command('build-catalog-snapshot')
+@click.option('--every', type=int, default=0, help='Keep running and rebuild every N seconds')
+@with_appcontext
+def build_catalog_snapshot(every):
+    """Build the shared catalog snapshot (run once, or as a refresher process)"""
+    path = current_app.config['CATALOG_SNAPSHOT_PATH']
+    while True:
+        count = build_snapshot(path)
+        db.session.remove()
+        print(f'Catalog snapshot with {count} books written to {path}')
+        if not every:
+            break
+        time.sleep(every)
+
+
+def init_app(app):
+    """Register the snapshot CLI command and watch ORM commits for stock changes (once per process)"""
+    app.cli.add_command(build_catalog_snapshot)
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', _after_rollback)
@@ -0,0 +1,135 @@
+"""
+CLI commands for Online Bookstore
+Database creation, upgrades and sample data
+"""
+import click
+from flask.cli import with_appcontext
+
+from models import db, User, Book, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, \
+    create_missing_columns, create_missing_indexes
+
+@click.command('init-db')
+@with_appcontext
+def init_db():
+    """Initialize the database with tables"""
+    db.create_all()
+    print('Database initialized!')
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db():
+    """Bring an existing database up to date with new tables and indexes"""
+    db.create_all()
+    for name in create_missing_columns():
+        print(f'Added column {name}')
+    for name in create_missing_indexes():
+        print(f'Created index {name}')
+    
+    summarized = backfill_order_summaries(Order, OrderItem) + \
+        backfill_order_summaries(ArchivedOrder, ArchivedOrderItem)
+    if summarized:
+        print(f'Summarized {summarized} existing orders')
+    print('Database upgraded!')
+
+def backfill_order_summaries(order_model, item_model, batch_size=500):
+    """Fill in the summary of orders placed before summaries existed"""
+    summarized = 0
+    while True:
+        orders = order_model.query.filter(order_model.item_count.is_(None)).limit(batch_size).all()
+        if not orders:
+            return summarized
+        
+        # One query for the items of the whole batch
+        items = {}
+        rows = db.session.query(item_model.order_id, Book.title, item_model.quantity) \
+            .join(Book, item_model.book_id == Book.id) \
+            .filter(item_model.order_id.in_([order.id for order in orders])) \
+            .order_by(item_model.id).all()
+        for order_id, title, quantity in rows:
+            items.setdefault(order_id, []).append((title, quantity))
+        
+        for order in orders:
+            # ArchivedOrder has the same summary columns as Order
+            Order.set_summary(order, items.get(order.id, []))
+        db.session.commit()
+        summarized += len(orders)
+
+@click.command('seed-db')
+@with_appcontext
+def seed_db():
+    """Seed database with sample data"""
+    # Create admin user
+    admin = User(username='admin', email='admin@bookstore.com', full_name='Admin User', role='admin')
+    admin.set_password('admin123')
+    db.session.add(admin)
+    
+    # Create sample user
+    user = User(username='john', email='john@example.com', full_name='John Doe', phone='9841234567')
+    user.set_password('password123')
+    db.session.add(user)
+    
+    # Sample books data
+    sample_books = [
+        {
+            'title': 'The Great Gatsby', 'author': 'F. Scott Fitzgerald', 'isbn': '9780743273565',
+            'price': 650.00, 'stock_quantity': 25, 'category': 'Fiction',
+            'description': 'A classic American novel set in the Jazz Age.',
+            'publisher': 'Scribner', 'publication_year': 1925, 'pages': 180, 'rating': 4.5
+        },
+        {
+            'title': 'To Kill a Mockingbird', 'author': 'Harper Lee', 'isbn': '9780061120084',
+            'price': 700.00, 'stock_quantity': 30, 'category': 'Fiction',
+            'description': 'A powerful story of racial injustice and childhood innocence.',
+            'publisher': 'Harper Perennial', 'publication_year': 1960, 'pages': 324, 'rating': 4.8
+        },
+        {
+            'title': '1984', 'author': 'George Orwell', 'isbn': '9780451524935',
+            'price': 550.00, 'stock_quantity': 20, 'category': 'Fiction',
+            'description': 'A dystopian social science fiction novel.',
+            'publisher': 'Signet Classic', 'publication_year': 1949, 'pages': 328, 'rating': 4.7
+        },
+        {
+            'title': 'Python Crash Course', 'author': 'Eric Matthes', 'isbn': '9781593279288',
+            'price': 1200.00, 'stock_quantity': 15, 'category': 'Technology',
+            'description': 'A hands-on, project-based introduction to programming.',
+            'publisher': 'No Starch Press', 'publication_year': 2019, 'pages': 544, 'rating': 4.6
+        },
+        {
+            'title': 'Clean Code', 'author': 'Robert C. Martin', 'isbn': '9780132350884',
+            'price': 1500.00, 'stock_quantity': 12, 'category': 'Technology',
+            'description': 'A handbook of agile software craftsmanship.',
+            'publisher': 'Prentice Hall', 'publication_year': 2008, 'pages': 464, 'rating': 4.7
+        },
+        {
+            'title': 'Sapiens', 'author': 'Yuval Noah Harari', 'isbn': '9780062316097',
+            'price': 900.00, 'stock_quantity': 18, 'category': 'History',
+            'description': 'A brief history of humankind.',
+            'publisher': 'Harper', 'publication_year': 2015, 'pages': 443, 'rating': 4.5
+        },
+        {
+            'title': 'Atomic Habits', 'author': 'James Clear', 'isbn': '9780735211292',
+            'price': 800.00, 'stock_quantity': 22, 'category': 'Self-Help',
+            'description': 'An easy and proven way to build good habits.',
+            'publisher': 'Avery', 'publication_year': 2018, 'pages': 320, 'rating': 4.8
+        },
+        {
+            'title': 'The Alchemist', 'author': 'Paulo Coelho', 'isbn': '9780062315007',
+            'price': 600.00, 'stock_quantity': 28, 'category': 'Fiction',
+            'description': 'A magical story about following your dreams.',
+            'publisher': 'HarperOne', 'publication_year': 1988, 'pages': 208, 'rating': 4.6
+        }
+    ]
+    
+    for book_data in sample_books:
+        book = Book(**book_data)
+        db.session.add(book)
+    
+    db.session.commit()
+    print('Database seeded with sample data!')
+
+
+def init_app(app):
+    """Register the database CLI commands"""
+    app.cli.add_command(init_db)
+    app.cli.add_command(upgrade_db)
+    app.cli.add_command(seed_db)
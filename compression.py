@@ -0,0 +1,56 @@
+"""
+Response compression for Online Bookstore
+Gzips HTML (and other text) responses for clients that accept it,
+including streamed responses, which are compressed chunk by chunk
+"""
+import gzip
+import zlib
+
+from flask import request
+
+
+def _gzip_stream(chunks, level, flush_size):
+    """Compress an iterable of chunks, flushing whenever enough output is buffered"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip container
+    buffered = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        buffered += len(chunk)
+        # Sync flushes let the browser start rendering before the stream ends
+        if buffered >= flush_size:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            buffered = 0
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def init_app(app):
+    """Register the compression after_request hook"""
+
+    @app.after_request
+    def compress_response(response):
+        config = app.config
+        if (not config['COMPRESS_ENABLED']
+                or response.status_code < 200 or response.status_code >= 300
+                or response.mimetype not in config['COMPRESS_MIMETYPES']
+                or 'Content-Encoding' in response.headers
+                or response.direct_passthrough
+                or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+            return response
+
+        if response.is_streamed:
+            response.response = _gzip_stream(response.response, config['COMPRESS_LEVEL'],
+                                             config['COMPRESS_FLUSH_SIZE'])
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESS_MIN_SIZE']:
+                return response
+            response.set_data(gzip.compress(data, compresslevel=config['COMPRESS_LEVEL']))
+
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        return response
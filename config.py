@@ -31,6 +31,165 @@ class Config:
     # Allowed file extensions for book covers
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     
+    # Widths of the resized cover copies offered in srcset (needs Pillow)
+    COVER_WIDTHS = (150, 300, 600)
+    
+    # Seconds a cover's file check is reused before looking on disk again
+    COVER_CHECK_INTERVAL = 60
+    
     # Pagination settings
     BOOKS_PER_PAGE = 12
     ORDERS_PER_PAGE = 10
+    
+    # Stock reservation settings
+    # Cart quantities are held for this long once checkout starts
+    RESERVATION_TTL_MINUTES = 15
+    # Background sweeper removes expired holds in batches
+    RESERVATION_SWEEP_INTERVAL = 60
+    RESERVATION_SWEEP_BATCH_SIZE = 500
+    RESERVATION_SWEEPER_ENABLED = True
+    
+    # Shared catalog snapshot (memory-mapped by every worker process)
+    CATALOG_SNAPSHOT_ENABLED = True
+    CATALOG_SNAPSHOT_PATH = os.path.join(basedir, 'instance', 'catalog_snapshot.bin')
+    # How often a worker checks whether a new snapshot was swapped in (seconds)
+    CATALOG_SNAPSHOT_CHECK_INTERVAL = 5
+    # Rebuild if no refresher process has written a snapshot for this long (seconds)
+    CATALOG_SNAPSHOT_MAX_AGE = 300
+    
+    # Admin listings: page size limit, and pages larger than the threshold
+    # are streamed to the browser while rows are read in batches
+    ADMIN_BOOKS_PER_PAGE = 20
+    ADMIN_MAX_PER_PAGE = 5000
+    ADMIN_STREAM_THRESHOLD = 100
+    STREAM_YIELD_PER = 200
+    
+    # Gzip compression of text responses
+    COMPRESS_ENABLED = True
+    COMPRESS_LEVEL = 6
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_FLUSH_SIZE = 16 * 1024
+    COMPRESS_MIMETYPES = {'text/html', 'text/css', 'text/plain', 'application/json', 'application/javascript'}
+    
+    # Rate limiting (token buckets)
+    # 'memory' keeps buckets per worker process, 'sqlite' shares them between workers
+    RATELIMIT_ENABLED = True
+    RATELIMIT_BACKEND = 'memory'
+    # Budget per endpoint: bucket size, refill period and what the bucket is keyed by
+    RATE_LIMITS = {
+        'search': {'requests': 30, 'per_seconds': 60, 'key': 'ip'},
+        'login': {'requests': 10, 'per_seconds': 300, 'key': 'ip'},
+        'add_to_cart': {'requests': 60, 'per_seconds': 60, 'key': 'user'},
+        'availability': {'requests': 60, 'per_seconds': 60, 'key': 'ip'},
+    }
+    
+    # Password hashing (see werkzeug.security.generate_password_hash)
+    # Give the method in full so stored hashes can be compared against it;
+    # logins transparently rehash passwords stored with other parameters
+    PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+    PASSWORD_SALT_LENGTH = 16
+    # Hashing runs in a pool of this many processes (0 = on the request thread).
+    # The pool is per worker process: N workers start N times this many
+    # processes, each using about 32 MB while hashing with scrypt. The request
+    # still waits for its hash, so only threaded workers gain from the pool
+    PASSWORD_HASH_WORKERS = 2
+    # Requests beyond this many queued hashes wait for a free slot
+    PASSWORD_HASH_MAX_PENDING = 64
+    
+    # Order archival: finished orders older than this move to the archive tables
+    ORDER_ARCHIVE_AFTER_DAYS = 90
+    ORDER_ARCHIVE_BATCH_SIZE = 500
+    
+    # Batch order status changes: orders changed per transaction
+    ORDER_STATUS_BATCH_SIZE = 500
+    
+    # Popularity: the 7- and 30-day sales counts are recomputed from recent
+    # orders this often (seconds), dropping the sales that left the window
+    POPULARITY_REFRESH_INTERVAL = 3600
+    POPULARITY_REFRESHER_ENABLED = True
+    POPULARITY_BATCH_SIZE = 500
+    
+    # Request profiler (off by default). When enabled, this fraction of requests
+    # is profiled, plus any request whose PROFILER_HEADER carries a token from
+    # the admin Profiles page or `flask profile-token <admin>`
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED') == '1'
+    PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', 0.0))
+    PROFILER_HEADER = 'X-Profile-Token'
+    PROFILER_TOKEN_MAX_AGE = 3600
+    # Seconds between stack samples for the flame graph files
+    PROFILER_SAMPLE_INTERVAL = 0.002
+    PROFILER_DIR = os.path.join(basedir, 'instance', 'profiles')
+    PROFILER_MAX_PROFILES = 200
+    
+    # Compiled templates are cached here so new workers skip compiling them (None = off)
+    JINJA_BYTECODE_CACHE_DIR = os.path.join(basedir, 'instance', 'jinja_cache')
+    # Time template/block rendering and SQL per request (Server-Timing header),
+    # and log requests whose db + render time exceeds RENDER_TIMING_LOG_MS
+    RENDER_TIMING_ENABLED = True
+    RENDER_TIMING_LOG_MS = 500
+    # The header goes to admins and in debug mode; True sends it to everyone
+    SERVER_TIMING_PUBLIC = False
+    
+    # Prometheus metrics at /metrics. With several worker processes, point
+    # METRICS_DIR at a directory they share so /metrics reports all of them
+    # (one machine per directory: files of exited pids are deleted)
+    METRICS_ENABLED = True
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_WRITE_INTERVAL = 1.0
+    
+    # Static files and templates are fingerprinted for long-term caching;
+    # set ASSET_VERSION (e.g. to the deployed commit) to choose the cache version
+    ASSET_VERSION = os.environ.get('ASSET_VERSION')
+    # The service worker serves cached catalog pages up to this age (keep it
+    # below the CSRF token lifetime, WTF_CSRF_TIME_LIMIT, one hour by default)
+    SW_PAGE_MAX_AGE = 1800
+    
+    # Faceted browsing: price band boundaries (NPR) and how often each worker
+    # rebuilds its facet bitmaps to pick up other workers' catalog writes
+    FACET_PRICE_BANDS = (500, 1000, 2000, 5000)
+    FACETS_MAX_AGE = 300
+    
+    # Bloom filters of taken usernames/emails answer most availability checks
+    # without a query (sized for at least this many users, 1% false positives)
+    AVAILABILITY_FILTER_ENABLED = True
+    AVAILABILITY_MIN_CAPACITY = 10000
+    AVAILABILITY_ERROR_RATE = 0.01
+    # Seconds between picking up users registered through other workers
+    AVAILABILITY_REFRESH_INTERVAL = 5
+
+    
+    # Bulk catalog changes: rows shown in the preview
+    BULK_PREVIEW_ROWS = 100
+
+    
+    # Sitemaps and product feed, written as plain and precompressed files.
+    # SITE_URL is the public address used in their links
+    SITE_URL = os.environ.get('SITE_URL', 'http://localhost:5000')
+    SITEMAP_DIR = os.path.join(basedir, 'instance', 'sitemaps')
+    SITEMAP_PAGE_SIZE = 10000  # books per sitemap file (at most 50,000)
+    SITEMAP_MAX_AGE = 3600  # regenerate on request when older than this
+
+    
+    # Warm-up at worker start; /healthz reports not ready until it is done
+    WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', '1') == '1'
+    WARMUP_IN_BACKGROUND = True
+    WARMUP_TABLES = ('books', 'users', 'orders', 'order_items')
+    WARMUP_PRELOAD_MAX_MB = 256  # read at most this much of the SQLite file
+
+    
+    # Group commit of checkouts by a single writer thread (see order_writer.py)
+    ORDER_WRITER_ENABLED = os.environ.get('ORDER_WRITER_ENABLED') == '1'
+    ORDER_WRITER_MAX_BATCH = 32
+    ORDER_WRITER_MAX_WAIT = 0.005  # seconds to wait for more orders to batch
+    ORDER_WRITER_MAX_PENDING = 256  # queued orders before checkouts wait to enqueue
+    ORDER_WRITER_TIMEOUT = 15  # seconds a checkout waits for its order
+
+
+class ProductionConfig(Config):
+    """
+    Settings for deployed workers, e.g.
+    gunicorn "app:create_app('config.ProductionConfig', serving=True)"
+    """
+    
+    # Templates only change on deploy, so never stat them for changes
+    TEMPLATES_AUTO_RELOAD = False
@@ -0,0 +1,140 @@
+"""
+Book cover helpers for Online Bookstore
+Resized copies of each cover (for srcset) and placeholder images generated
+from the book title, used by the cover_image macro in templates/_macros.html.
+Resizing needs Pillow (pip install Pillow); without it covers are served at
+their original size only.
+
+Which copies of a cover exist, and their fingerprinted URLs, are cached per
+file for COVER_CHECK_INTERVAL seconds, so listing pages don't stat every
+variant of every card on each request.
+"""
+import base64
+import hashlib
+import os
+import threading
+import time
+from functools import lru_cache
+from html import escape
+
+import click
+from flask import current_app, url_for
+from flask.cli import with_appcontext
+
+# Background colours for placeholders, picked by title
+PLACEHOLDER_COLOURS = ('#8B4513', '#654321', '#A0522D', '#6B4226', '#3d2817', '#7B3F00')
+
+
+def _cover_path(filename, width=None):
+    folder = current_app.config['UPLOAD_FOLDER']
+    if width:
+        return os.path.join(folder, f'w{width}', filename)
+    return os.path.join(folder, filename)
+
+
+def cover_srcset(filename):
+    """srcset value listing the resized copies of a cover that exist"""
+    entries = []
+    for width in current_app.config['COVER_WIDTHS']:
+        if os.path.isfile(_cover_path(filename, width)):
+            url = url_for('static', filename=f'images/book_covers/w{width}/{filename}')
+            entries.append(f'{url} {width}w')
+    return ', '.join(entries)
+
+
+_covers = {}  # filename -> (checked_at, (src, srcset) or None)
+_covers_lock = threading.Lock()
+
+
+def cover_urls(filename):
+    """
+    (src, srcset) of a cover image, or None when the file is missing
+    Rechecked on disk at most every COVER_CHECK_INTERVAL seconds
+    """
+    if not filename:
+        return None
+    now = time.monotonic()
+    cached = _covers.get(filename)
+    if cached is None or now - cached[0] >= current_app.config['COVER_CHECK_INTERVAL']:
+        urls = None
+        if os.path.isfile(_cover_path(filename)):
+            urls = (url_for('static', filename=f'images/book_covers/{filename}'), cover_srcset(filename))
+        with _covers_lock:
+            cached = _covers[filename] = (now, urls)
+    return cached[1]
+
+
+def forget(filename):
+    """Drop a cover's cached URLs after its files changed"""
+    with _covers_lock:
+        _covers.pop(filename, None)
+
+
+@lru_cache(maxsize=1024)
+def cover_placeholder(title, width, height):
+    """Data URI of an SVG cover showing the title, coloured by the title"""
+    colour = PLACEHOLDER_COLOURS[int(hashlib.md5(title.encode()).hexdigest(), 16) % len(PLACEHOLDER_COLOURS)]
+    label = escape(title if len(title) <= 24 else title[:23] + '…')
+    svg = (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+           f'viewBox="0 0 {width} {height}"><rect width="100%" height="100%" fill="{colour}"/>'
+           f'<text x="50%" y="50%" fill="#fff" font-family="sans-serif" font-size="{max(width // 14, 10)}" '
+           f'text-anchor="middle" dominant-baseline="middle">{label}</text></svg>')
+    return 'data:image/svg+xml;base64,' + base64.b64encode(svg.encode()).decode()
+
+
+def generate_variants(filename):
+    """
+    Write the COVER_WIDTHS copies of a cover next to the original
+    Returns the number written, or None when Pillow is not installed
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    written = 0
+    with Image.open(_cover_path(filename)) as image:
+        for width in current_app.config['COVER_WIDTHS']:
+            if width >= image.width:
+                continue
+            height = round(image.height * width / image.width)
+            path = _cover_path(filename, width)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            image.resize((width, height), Image.LANCZOS).save(path, format=image.format)
+            written += 1
+    return written
+
+
+def resize_upload(filename):
+    """Create the resized copies of a newly uploaded cover, logging unreadable images"""
+    try:
+        generate_variants(filename)
+    except OSError:
+        current_app.logger.warning('Could not resize cover %s', filename, exc_info=True)
+    forget(filename)
+
+
+@click.command('resize-covers')
+@with_appcontext
+def resize_covers_command():
+    """Create the resized copies of every cover image"""
+    folder = current_app.config['UPLOAD_FOLDER']
+    total = 0
+    for filename in sorted(os.listdir(folder)):
+        if not os.path.isfile(os.path.join(folder, filename)):
+            continue
+        try:
+            written = generate_variants(filename)
+        except OSError as error:  # Not an image Pillow can read
+            print(f'Skipped {filename}: {error}')
+            continue
+        if written is None:
+            raise click.ClickException('Pillow is required: pip install Pillow')
+        total += written
+    print(f'Wrote {total} resized covers.')
+
+
+def init_app(app):
+    """Expose the cover helpers to templates and register the CLI command"""
+    app.jinja_env.globals.update(cover_urls=cover_urls, cover_placeholder=cover_placeholder)
+    app.cli.add_command(resize_covers_command)
@@ -0,0 +1,338 @@
+"""
+Faceted catalog browsing for Online Bookstore
+Keeps one bitmap per facet value (category, language, publication decade,
+price band, availability) in process memory. Bit n stands for the book at
+position n; Python integers serve as the bitmaps, so AND/OR/popcount run
+in C over whole machine words.
+
+Filters OR the selected values within a facet and AND the facets together.
+Facet counts for the sidebar are popcounts of each value's bitmap against
+the filter from every *other* facet, so choosing a value never hides the
+alternatives. Book inserts/updates/deletes made through the ORM are applied
+to the bitmaps when their transaction commits; a full rebuild happens every
+FACETS_MAX_AGE seconds to pick up writes from other processes.
+"""
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Book
+from projections import summaries_by_ids
+
+# Facet name -> query string parameter of /books
+FACETS = {
+    'category': 'category',
+    'language': 'language',
+    'decade': 'decade',
+    'price': 'price',
+    'availability': 'availability',
+}
+
+FACET_LABELS = {
+    'category': 'Category',
+    'language': 'Language',
+    'decade': 'Published',
+    'price': 'Price',
+    'availability': 'Availability',
+}
+
+# Sort orders, matching the books() sort options: (key function, reverse)
+SORTS = {
+    'title': (lambda key: key[0].lower(), False),
+    'price_asc': (lambda key: key[1], False),
+    'price_desc': (lambda key: key[1], True),
+    'rating': (lambda key: key[2], True),
+    'latest': (lambda key: key[3], True),
+    'bestselling': (lambda key: (key[4], key[5], key[2]), True),
+}
+
+COLUMNS = (Book.id, Book.title, Book.price, Book.rating, Book.stock_quantity,
+           Book.category, Book.language, Book.publication_year, Book.created_at,
+           Book.sales_30d, Book.sales_7d)
+
+
+def price_band(price, bands):
+    """Band a price falls in, as 'low-high' or 'low+' for the last band"""
+    low = 0
+    for high in bands:
+        if price < high:
+            return f'{low}-{high}'
+        low = high
+    return f'{low}+'
+
+
+def value_label(facet, value):
+    """Human readable label of a facet value"""
+    if facet == 'decade':
+        return 'Unknown' if value == 'unknown' else f'{value}s'
+    if facet == 'price':
+        return f'NPR {value.replace("-", " - ")}'
+    if facet == 'availability':
+        return 'In stock' if value == 'in_stock' else 'Out of stock'
+    return value
+
+
+def _sort_value(facet, value):
+    """Order values are listed in the sidebar"""
+    if facet == 'price':
+        return int(value.split('-')[0].rstrip('+'))
+    if facet == 'decade':
+        return -int(value) if value != 'unknown' else 0
+    return value
+
+
+class FacetIndex:
+    """Bitmaps per facet value plus the sort keys of every book"""
+
+    def __init__(self, price_bands):
+        self.price_bands = price_bands
+        self.positions = {}  # book id -> bit position
+        self.ids = []  # bit position -> book id
+        self.book_values = []  # bit position -> {facet: value}, None once deleted
+        self.sort_keys = []  # bit position -> (title, price, rating, created_at, sales_30d, sales_7d)
+        self.bitmaps = {facet: {} for facet in FACETS}
+        self.alive = 0
+        self.built_at = time.monotonic()
+        self._orders = {}  # sort -> positions in that order, rebuilt on demand
+        self._lock = threading.Lock()
+
+    def _values(self, row):
+        year = row.publication_year
+        return {
+            'category': row.category,
+            'language': row.language or 'Unknown',
+            'decade': str(year // 10 * 10) if year else 'unknown',
+            'price': price_band(row.price, self.price_bands),
+            'availability': 'in_stock' if row.stock_quantity > 0 else 'out_of_stock',
+        }
+
+    def _clear(self, position):
+        bit = 1 << position
+        for facet, value in self.book_values[position].items():
+            self.bitmaps[facet][value] &= ~bit
+        self.alive &= ~bit
+
+    def set_book(self, row):
+        """Add a book or move it to its new facet values"""
+        with self._lock:
+            position = self.positions.get(row.id)
+            if position is None:
+                position = self.positions[row.id] = len(self.ids)
+                self.ids.append(row.id)
+                self.book_values.append(None)
+                self.sort_keys.append(None)
+            elif self.book_values[position] is not None:
+                self._clear(position)
+
+            bit = 1 << position
+            values = self.book_values[position] = self._values(row)
+            for facet, value in values.items():
+                bitmaps = self.bitmaps[facet]
+                bitmaps[value] = bitmaps.get(value, 0) | bit
+            self.alive |= bit
+
+            sort_key = (row.title, row.price, row.rating or 0, row.created_at or datetime.min,
+                        row.sales_30d or 0, row.sales_7d or 0)
+            if self.sort_keys[position] != sort_key:
+                self.sort_keys[position] = sort_key
+                self._orders = {}
+
+    def remove_book(self, book_id):
+        with self._lock:
+            position = self.positions.get(book_id)
+            if position is not None and self.book_values[position] is not None:
+                self._clear(position)
+                self.book_values[position] = None
+
+    def ids_bitmap(self, ids):
+        """Bitmap of the given book ids (e.g. text search results)"""
+        bitmap = 0
+        for book_id in ids:
+            position = self.positions.get(book_id)
+            if position is not None:
+                bitmap |= 1 << position
+        return bitmap
+
+    def _facet_bitmap(self, facet, values):
+        bitmaps = self.bitmaps[facet]
+        bitmap = 0
+        with self._lock:
+            for value in values:
+                bitmap |= bitmaps.get(value, 0)
+        return bitmap
+
+    def filter(self, selected, base=None, exclude=None):
+        """AND of the selected facets (OR within each facet), optionally leaving one facet out"""
+        bitmap = self.alive if base is None else base & self.alive
+        for facet, values in selected.items():
+            if values and facet != exclude:
+                bitmap &= self._facet_bitmap(facet, values)
+        return bitmap
+
+    def counts(self, selected, base=None):
+        """{facet: [(value, label, count, checked)]} for the sidebar"""
+        result = {}
+        for facet in FACETS:
+            others = self.filter(selected, base, exclude=facet)
+            chosen = selected.get(facet) or ()
+            # Commits in other threads add values to these dicts
+            with self._lock:
+                bitmaps = list(self.bitmaps[facet].items())
+            rows = [
+                (value, value_label(facet, value), (bitmap & others).bit_count(), value in chosen)
+                for value, bitmap in bitmaps
+                if bitmap or value in chosen
+            ]
+            rows.sort(key=lambda row: _sort_value(facet, row[0]))
+            result[facet] = rows
+        return result
+
+    def _order(self, sort):
+        order = self._orders.get(sort)
+        if order is None:
+            with self._lock:
+                key, reverse = SORTS.get(sort, SORTS['title'])
+                keys = self.sort_keys
+                order = sorted((position for position in range(len(keys)) if keys[position] is not None),
+                               key=lambda position: key(keys[position]), reverse=reverse)
+                self._orders[sort] = order
+        return order
+
+    def listing(self, bitmap, sort='title', offset=0, limit=None):
+        """Ids of the books in bitmap, in the requested order"""
+        if not bitmap:
+            return []
+        # Bit n of the bitmap is character n of this string
+        bits = bin(bitmap)[:1:-1]
+        size = len(bits)
+        end = offset + limit if limit is not None else None
+        result = []
+        seen = 0
+        for position in self._order(sort):
+            if position >= size or bits[position] != '1':
+                continue
+            if seen >= offset:
+                result.append(self.ids[position])
+                if end is not None and seen + 1 >= end:
+                    break
+            seen += 1
+        return result
+
+
+class FacetPagination(Pagination):
+    """Pagination over a facet filter result, usable by the books.html template"""
+
+    def _query_items(self):
+        index = self._query_args['index']
+        ids = index.listing(self._query_args['bitmap'], self._query_args['sort'],
+                            offset=self._query_offset, limit=self.per_page)
+        return summaries_by_ids(ids)
+
+    def _query_count(self):
+        return self._query_args['bitmap'].bit_count()
+
+
+def build_index():
+    """Build a fresh index from the books table"""
+    index = FacetIndex(current_app.config['FACET_PRICE_BANDS'])
+    for row in db.session.query(*COLUMNS).yield_per(1000):
+        index.set_book(row)
+    return index
+
+
+# Per-process index
+_lock = threading.Lock()
+_index = None
+
+
+def get_index():
+    """Return this process's index, (re)building it when missing or older than FACETS_MAX_AGE"""
+    global _index
+    index = _index
+    if index is not None and time.monotonic() - index.built_at < current_app.config['FACETS_MAX_AGE']:
+        return index
+
+    with _lock:
+        if _index is index:
+            _index = build_index()
+        return _index
+
+
+def invalidate():
+    """Drop the index after writes the ORM events don't see (e.g. bulk UPDATEs)"""
+    global _index
+    _index = None
+
+
+def selected_filters(args):
+    """{facet: [values]} from the /books query string; only in-stock books by default"""
+    selected = {facet: [value for value in args.getlist(param) if value] for facet, param in FACETS.items()}
+    if not selected['availability']:
+        selected['availability'] = ['in_stock']
+    elif 'any' in selected['availability']:
+        selected['availability'] = []
+    return selected
+
+
+# ---- Incremental updates from ORM writes ----
+
+class _Row:
+    """Copy of the facet-relevant values of a Book instance"""
+
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+
+def _after_flush(session, flush_context):
+    """Copy the facet-relevant values of Books written in this flush"""
+    changes = session.info.setdefault('facet_changes', {})
+    for instance in list(session.new) + list(session.dirty):
+        if isinstance(instance, Book):
+            # Read the loaded values directly, so nothing is loaded mid-flush
+            state = instance.__dict__
+            if all(column.key in state for column in COLUMNS):
+                changes[instance.id] = _Row({column.key: state[column.key] for column in COLUMNS})
+            else:
+                session.info['facet_rebuild'] = True
+    for instance in session.deleted:
+        if isinstance(instance, Book):
+            changes[instance.id] = None
+
+
+def _after_commit(session):
+    # Also fired when a savepoint is released; wait for the real commit
+    if session.in_nested_transaction():
+        return
+    changes = session.info.pop('facet_changes', None)
+    if session.info.pop('facet_rebuild', False):
+        invalidate()
+        return
+    index = _index
+    if not changes or index is None:
+        return
+    for book_id, row in changes.items():
+        if row is None:
+            index.remove_book(book_id)
+        else:
+            index.set_book(row)
+
+
+def _after_rollback(session, previous_transaction):
+    # A savepoint rollback keeps the changes of the enclosing transaction
+    if previous_transaction.nested:
+        return
+    session.info.pop('facet_changes', None)
+    session.info.pop('facet_rebuild', None)
+
+
+def init_app(app):
+    """Hook the index into ORM commits (once per process)"""
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', _after_rollback)
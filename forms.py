@@ -4,9 +4,15 @@ Includes validation for user input
 """
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
-from wtforms import StringField, PasswordField, TextAreaField, FloatField, IntegerField, SelectField, SubmitField
-from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError, NumberRange
-from models import User, Book
+from wtforms import StringField, PasswordField, TextAreaField, FloatField, IntegerField, SelectField, SubmitField, DateField
+from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError, NumberRange, Optional
+from models import Book
+import availability
+import order_status
+
+# Book categories offered by the admin forms
+CATEGORIES = ['Fiction', 'Non-Fiction', 'Science', 'Technology', 'History', 'Biography',
+              'Self-Help', 'Business', 'Children', 'Romance', 'Mystery', 'Fantasy']
 
 class RegistrationForm(FlaskForm):
     """Form for new user registration"""
@@ -26,14 +32,12 @@ class RegistrationForm(FlaskForm):
     
     def validate_username(self, username):
         """Check if username already exists"""
-        user = User.query.filter_by(username=username.data).first()
-        if user:
+        if not availability.username_available(username.data):
             raise ValidationError('Username already taken. Please choose a different one.')
     
     def validate_email(self, email):
         """Check if email already exists"""
-        user = User.query.filter_by(email=email.data).first()
-        if user:
+        if not availability.email_available(email.data):
             raise ValidationError('Email already registered. Please use a different one.')
 
 
@@ -59,20 +63,7 @@ class BookForm(FlaskForm):
     stock_quantity = IntegerField('Stock Quantity', 
                                  validators=[DataRequired(), NumberRange(min=0, message='Stock cannot be negative')])
     category = SelectField('Category', 
-                          choices=[
-                              ('Fiction', 'Fiction'),
-                              ('Non-Fiction', 'Non-Fiction'),
-                              ('Science', 'Science'),
-                              ('Technology', 'Technology'),
-                              ('History', 'History'),
-                              ('Biography', 'Biography'),
-                              ('Self-Help', 'Self-Help'),
-                              ('Business', 'Business'),
-                              ('Children', 'Children'),
-                              ('Romance', 'Romance'),
-                              ('Mystery', 'Mystery'),
-                              ('Fantasy', 'Fantasy')
-                          ],
+                          choices=[(category, category) for category in CATEGORIES],
                           validators=[DataRequired()])
     description = TextAreaField('Description', 
                                validators=[Length(max=1000)])
@@ -143,3 +134,62 @@ class SearchForm(FlaskForm):
                               ('Fantasy', 'Fantasy')
                           ])
     submit = SubmitField('Search')
+
+
+class BulkCsvForm(FlaskForm):
+    """Form for bulk price/stock changes from a CSV"""
+    csv_file = FileField('CSV File', 
+                        validators=[FileAllowed(['csv', 'txt'], 'CSV files only!')])
+    csv_text = TextAreaField('Or paste CSV')
+    preview = SubmitField('Preview')
+    apply = SubmitField('Apply Changes')
+
+    def validate_csv_text(self, csv_text):
+        """Need either an uploaded file or pasted rows"""
+        if not self.csv_file.data and not (csv_text.data or '').strip():
+            raise ValidationError('Upload a CSV file or paste its rows.')
+
+
+class BulkAdjustForm(FlaskForm):
+    """Form for a percentage price change and/or restock of a filtered set of books"""
+    category = SelectField('Category', 
+                          choices=[('', 'All Categories')] + [(category, category) for category in CATEGORIES])
+    publisher = StringField('Publisher', 
+                           validators=[Length(max=100)])
+    percent = FloatField('Price Change (%)', 
+                        validators=[Optional(), NumberRange(min=-90, max=500, message='Between -90% and +500%')])
+    restock = IntegerField('Add to Stock', 
+                          validators=[Optional(), NumberRange(min=1, max=100000)])
+    preview = SubmitField('Preview')
+    apply = SubmitField('Apply Changes')
+
+    def validate(self, extra_validators=None):
+        """Need a price change, a restock or both"""
+        if not super().validate(extra_validators):
+            return False
+        if not self.percent.data and not self.restock.data:
+            self.restock.errors.append('Enter a price change and/or a quantity to add.')
+            return False
+        return True
+
+
+class BatchStatusForm(FlaskForm):
+    """Form for moving many orders to a new status: listed ids and/or filters"""
+    order_ids = TextAreaField('Order IDs')
+    from_status = SelectField('Current Status', 
+                             choices=[('', 'Any')] + [(status, status) for status in order_status.STATUSES],
+                             default='')
+    placed_before = DateField('Placed Before', 
+                             validators=[Optional()])
+    to_status = SelectField('New Status', 
+                           choices=[(status, status) for status in order_status.STATUSES
+                                    if order_status.ALLOWED_FROM[status]],
+                           validators=[DataRequired()])
+    submit = SubmitField('Update Orders')
+
+    def validate_order_ids(self, order_ids):
+        """Ids separated by commas, spaces or new lines"""
+        try:
+            order_status.parse_ids(order_ids.data)
+        except ValueError as error:
+            raise ValidationError(str(error))
@@ -0,0 +1,91 @@
+"""
+Password hashing service for Online Bookstore
+Runs werkzeug's deliberately slow password hashing in a small process pool
+per worker process, so a burst of logins or registrations runs outside the
+GIL instead of stalling the threads that serve the catalog. A pool whose
+process died is replaced on the next hash.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Used when hashing outside an app context (e.g. from a Python shell)
+DEFAULTS = {
+    'PASSWORD_HASH_METHOD': 'scrypt:32768:8:1',
+    'PASSWORD_SALT_LENGTH': 16,
+    'PASSWORD_HASH_WORKERS': 0,
+    'PASSWORD_HASH_MAX_PENDING': 64,
+}
+
+_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+_slots = None
+
+
+def _config(name):
+    if has_app_context():
+        return current_app.config.get(name, DEFAULTS[name])
+    return DEFAULTS[name]
+
+
+def _get_pool(broken=None):
+    """Return this process's pool, creating it after a fork or in place of a broken one"""
+    global _pool, _pool_pid, _slots
+    workers = _config('PASSWORD_HASH_WORKERS')
+    if not workers:
+        return None
+
+    with _lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(_config('PASSWORD_HASH_MAX_PENDING'))
+        elif _pool is broken:
+            broken.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers)
+        return _pool
+
+
+def _run(function, *args):
+    """Run a hashing function in the pool (or inline when the pool is disabled)"""
+    pool = _get_pool()
+    if pool is None:
+        return function(*args)
+
+    # Bound the queue: once it is full, further requests wait here
+    with _slots:
+        try:
+            return pool.submit(function, *args).result()
+        except BrokenProcessPool:
+            # A pool process was killed (e.g. by the OOM killer); start a new pool
+            return _get_pool(broken=pool).submit(function, *args).result()
+
+
+def hash_password(password):
+    """Hash a password with the configured method"""
+    return _run(generate_password_hash, password,
+                _config('PASSWORD_HASH_METHOD'), _config('PASSWORD_SALT_LENGTH'))
+
+
+def verify_password(password_hash, password):
+    """Check a password against a stored hash"""
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """Check if a stored hash was made with different parameters than configured"""
+    return password_hash.split('$', 1)[0] != _config('PASSWORD_HASH_METHOD')
+
+
+def shutdown():
+    """Stop the worker processes of this process's pool"""
+    global _pool
+    with _lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown()
+        _pool = None
@@ -2,8 +2,11 @@
 Simple database initialization script
 Run this to create the database and add sample data
 """
-from app import app, db
-from models import User, Book
+from app import create_app
+from models import db, User, Book
+
+# Only the database is needed here, so skip registering the routes
+app = create_app(with_routes=False)
 
 print("🗄️  Initializing BookHaven Database...")
 print("=" * 50)
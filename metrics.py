@@ -0,0 +1,246 @@
+"""
+Metrics for Online Bookstore
+Request counts, status codes and latency histograms per endpoint, plus
+business counters, served at /metrics in the Prometheus text format.
+
+Updates go to a per-thread shard, so recording never takes a lock. With
+METRICS_DIR set, every worker process also writes its totals to a file in
+that directory about once per METRICS_WRITE_INTERVAL, and /metrics adds up
+the files of all workers, whichever worker answers the scrape. Files of
+processes that have exited are deleted then, so the directory has to be
+shared by the workers of one machine only.
+"""
+import json
+import os
+import threading
+import time
+
+from flask import Response, g, request
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+_shards = {}  # thread -> {(metric, labels): value}
+_retired = {}  # totals of shards whose threads have exited
+_lock = threading.Lock()  # Guards _shards/_retired, taken once per thread and per collection
+
+
+def _retire_dead_threads():
+    """Fold the shards of exited threads into _retired (call with _lock held)"""
+    for thread, shard in list(_shards.items()):
+        if not thread.is_alive():
+            _merge(_retired, shard)
+            del _shards[thread]
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = {}
+        with _lock:
+            # Servers may start a thread per request, so don't let shards pile up
+            _retire_dead_threads()
+            _shards[threading.current_thread()] = shard
+    return shard
+
+
+def _merge(target, source):
+    """Add one {key: value} sample dict into another; histogram values are lists"""
+    for key, value in source.items():
+        if isinstance(value, list):
+            current = target.setdefault(key, [0] * len(value))
+            for index, number in enumerate(value):
+                current[index] += number
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = (self.name, tuple(labels[name] for name in self.labelnames))
+        shard = _shard()
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Histogram:
+    """
+    Cumulative histogram with optional labels
+    Stored as per-bucket counts followed by the sum and the count
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = (self.name, tuple(labels[name] for name in self.labelnames))
+        shard = _shard()
+        counts = shard.get(key)
+        if counts is None:
+            counts = shard[key] = [0] * (len(self.buckets) + 3)  # buckets, +Inf, sum, count
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        else:
+            counts[len(self.buckets)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+
+REGISTRY = []
+
+REQUESTS = Counter('bookhaven_http_requests_total', 'HTTP requests by endpoint, method and status',
+                   ('endpoint', 'method', 'status'))
+LATENCY = Histogram('bookhaven_http_request_duration_seconds', 'HTTP request latency by endpoint',
+                    ('endpoint',))
+ORDERS_PLACED = Counter('bookhaven_orders_placed_total', 'Orders placed at checkout')
+CART_ADDS = Counter('bookhaven_cart_adds_total', 'Books added to carts')
+OUT_OF_STOCK = Counter('bookhaven_checkout_out_of_stock_total',
+                       'Checkouts rejected because a cart book was out of stock')
+
+
+def collect():
+    """Totals of this process, as {(metric, labels): value}"""
+    totals = {}
+    with _lock:
+        _retire_dead_threads()
+        for shard in _shards.values():
+            # dict() copies in one step, so a concurrent update cannot break it
+            _merge(totals, dict(shard))
+        _merge(totals, _retired)
+    return totals
+
+
+def _write_process_file(directory):
+    """Atomically replace this process's totals file"""
+    path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+    samples = [[name, list(labels), value] for (name, labels), value in collect().items()]
+    with open(path + '.tmp', 'w') as file:
+        json.dump(samples, file)
+    os.replace(path + '.tmp', path)
+
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # Alive, but owned by another user
+        return True
+    return True
+
+
+def collect_all(directory):
+    """Totals of every live worker process that wrote to the metrics directory"""
+    totals = collect()
+    own = f'metrics-{os.getpid()}.json'
+    for entry in os.listdir(directory):
+        if not entry.startswith('metrics-') or not entry.endswith('.json') or entry == own:
+            continue
+        pid = entry[len('metrics-'):-len('.json')]
+        if pid.isdigit() and not _process_exists(int(pid)):
+            # A worker that exited (or was restarted); its counters go with it
+            try:
+                os.remove(os.path.join(directory, entry))
+            except OSError:
+                pass
+            continue
+        try:
+            with open(os.path.join(directory, entry)) as file:
+                samples = json.load(file)
+        except (OSError, ValueError):
+            continue
+        _merge(totals, {(name, tuple(labels)): value for name, labels, value in samples})
+    return totals
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def exposition(totals):
+    """Render totals in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        kind = 'histogram' if isinstance(metric, Histogram) else 'counter'
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {kind}')
+        samples = sorted((labels, value) for (name, labels), value in totals.items() if name == metric.name)
+        if kind == 'counter' and not metric.labelnames and not samples:
+            samples = [((), 0)]
+
+        for labels, value in samples:
+            if kind == 'counter':
+                lines.append(f'{metric.name}{_format_labels(metric.labelnames, labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + ('+Inf',), value):
+                cumulative += count
+                le = (('le', bound),)
+                lines.append(f'{metric.name}_bucket{_format_labels(metric.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{metric.name}_sum{_format_labels(metric.labelnames, labels)} {value[-2]}')
+            lines.append(f'{metric.name}_count{_format_labels(metric.labelnames, labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Register the request hooks and the /metrics endpoint"""
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    directory = app.config['METRICS_DIR']
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    last_write = [0.0]
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    # Teardown runs after streamed bodies are sent, so latency covers them
+    @app.teardown_request
+    def record_request(error=None):
+        start = g.pop('metrics_start', None)
+        if start is None or request.endpoint == 'metrics':
+            return
+        endpoint = request.endpoint or 'unmatched'
+        LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, method=request.method,
+                     status=str(g.pop('metrics_status', 500)))
+
+        if directory and time.monotonic() - last_write[0] >= app.config['METRICS_WRITE_INTERVAL']:
+            last_write[0] = time.monotonic()
+            try:
+                _write_process_file(directory)
+            except OSError:
+                app.logger.exception('Could not write metrics file')
+
+    def metrics():
+        """Prometheus scrape endpoint"""
+        totals = collect_all(directory) if directory else collect()
+        return Response(exposition(totals), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -4,18 +4,25 @@ Defines all database tables and their relationships using Flask-SQLAlchemy
 """
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+import hashing
 from datetime import datetime
 
 # Initialize SQLAlchemy instance
 db = SQLAlchemy()
 
+# Number of book titles kept in an order's summary
+ORDER_SUMMARY_TITLES = 3
+
 class User(UserMixin, db.Model):
     """
     User model for storing user account information
     Includes both regular users and admin users
     """
     __tablename__ = 'users'
+    __table_args__ = (
+        # Admin statistics count customers by role
+        db.Index('ix_users_role', 'role'),
+    )
     
     # Primary key
     id = db.Column(db.Integer, primary_key=True)
@@ -35,17 +42,23 @@ class User(UserMixin, db.Model):
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set on every write, so other workers' availability filters pick up changed emails
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationship: One user can have many orders
     orders = db.relationship('Order', backref='customer', lazy='dynamic', cascade='all, delete-orphan')
     
     def set_password(self, password):
         """Hash and set the user's password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hashing.hash_password(password)
     
     def check_password(self, password):
         """Verify if the provided password matches the hash"""
-        return check_password_hash(self.password_hash, password)
+        return hashing.verify_password(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """Check if the stored hash uses outdated hashing parameters"""
+        return hashing.needs_rehash(self.password_hash)
     
     def is_admin(self):
         """Check if user has admin privileges"""
@@ -60,6 +73,14 @@ class Book(db.Model):
     Book model for storing book information in the catalog
     """
     __tablename__ = 'books'
+    __table_args__ = (
+        # Listing sorts walk these in order and filter stock from the index
+        db.Index('ix_books_rating_stock', 'rating', 'stock_quantity'),
+        db.Index('ix_books_created_stock', 'created_at', 'stock_quantity'),
+        db.Index('ix_books_price_stock', 'price', 'stock_quantity'),
+        db.Index('ix_books_category_title', 'category', 'title'),
+        db.Index('ix_books_sales_stock', 'sales_30d', 'sales_7d', 'rating', 'stock_quantity'),
+    )
     
     # Primary key
     id = db.Column(db.Integer, primary_key=True)
@@ -75,7 +96,8 @@ class Book(db.Model):
     
     # Book details
     category = db.Column(db.String(50), nullable=False, index=True)
-    description = db.Column(db.Text)
+    # Only the detail page shows it, so it is loaded on first access
+    description = db.deferred(db.Column(db.Text))
     publisher = db.Column(db.String(100))
     publication_year = db.Column(db.Integer)
     pages = db.Column(db.Integer)
@@ -85,8 +107,15 @@ class Book(db.Model):
     cover_image = db.Column(db.String(200), default='default_cover.jpg')
     rating = db.Column(db.Float, default=0.0)
     
+    # Copies sold in the last 7 and 30 days, kept by popularity.py for the
+    # bestselling sort and the featured books
+    sales_7d = db.Column(db.Integer, default=0)
+    sales_30d = db.Column(db.Integer, default=0)
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set on every write, so sitemaps and feeds can find the books that changed
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationship: One book can appear in many order items
     order_items = db.relationship('OrderItem', backref='book', lazy='dynamic')
@@ -104,6 +133,13 @@ class Order(db.Model):
     Order model for storing customer orders
     """
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Order history per user, newest first
+        db.Index('ix_orders_user_date', 'user_id', 'order_date'),
+        # Pending counts and admin listings
+        db.Index('ix_orders_status_date', 'status', 'order_date'),
+        db.Index('ix_orders_order_date', 'order_date'),
+    )
     
     # Primary key
     id = db.Column(db.Integer, primary_key=True)
@@ -127,9 +163,21 @@ class Order(db.Model):
     # Payment information
     payment_method = db.Column(db.String(50), default='Cash on Delivery')
     
+    # Summary written at checkout, so order lists render without
+    # loading order_items or books
+    item_count = db.Column(db.Integer)
+    total_quantity = db.Column(db.Integer)
+    summary_titles = db.Column(db.String(300))
+    
     # Relationship: One order can have many order items
     order_items = db.relationship('OrderItem', backref='order', lazy='dynamic', cascade='all, delete-orphan')
     
+    def set_summary(self, items):
+        """Store the summary from a list of (book title, quantity) pairs"""
+        self.item_count = len(items)
+        self.total_quantity = sum(quantity for _, quantity in items)
+        self.summary_titles = ', '.join(title for title, _ in items[:ORDER_SUMMARY_TITLES])[:300]
+    
     def __repr__(self):
         return f'<Order {self.id}>'
 
@@ -145,8 +193,8 @@ class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     
     # Foreign keys
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
-    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False, index=True)
     
     # Item details
     quantity = db.Column(db.Integer, nullable=False, default=1)
@@ -158,3 +206,192 @@ class OrderItem(db.Model):
     
     def __repr__(self):
         return f'<OrderItem {self.id}>'
+
+
+
+class ArchivedOrder(db.Model):
+    """
+    ArchivedOrder model for old Delivered/Cancelled orders
+    Same columns as Order; the archive job moves finished orders here so the
+    orders table only holds recent and in-progress orders
+    """
+    __tablename__ = 'orders_archive'
+    __table_args__ = (
+        db.Index('ix_orders_archive_user_date', 'user_id', 'order_date'),
+    )
+    
+    # Primary key (same id the order had in the orders table)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    
+    # Foreign key to User
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    
+    # Order information
+    order_date = db.Column(db.DateTime, nullable=False)
+    total_amount = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    
+    # Shipping information
+    shipping_address = db.Column(db.Text, nullable=False)
+    shipping_city = db.Column(db.String(100))
+    shipping_postal_code = db.Column(db.String(20))
+    shipping_phone = db.Column(db.String(20))
+    
+    # Payment information
+    payment_method = db.Column(db.String(50))
+    
+    # Summary copied from the order
+    item_count = db.Column(db.Integer)
+    total_quantity = db.Column(db.Integer)
+    summary_titles = db.Column(db.String(300))
+    
+    # When the order was moved to the archive
+    archived_at = db.Column(db.DateTime, nullable=False)
+    
+    # Relationships, named like Order's so templates can use either
+    customer = db.relationship('User')
+    order_items = db.relationship('ArchivedOrderItem', backref='order', lazy='dynamic')
+    
+    def __repr__(self):
+        return f'<ArchivedOrder {self.id}>'
+
+
+class ArchivedOrderItem(db.Model):
+    """
+    ArchivedOrderItem model for the items of archived orders
+    """
+    __tablename__ = 'order_items_archive'
+    
+    # Primary key (same id the item had in the order_items table)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    
+    # Foreign keys
+    order_id = db.Column(db.Integer, db.ForeignKey('orders_archive.id'), nullable=False, index=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
+    
+    # Item details
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    
+    # Relationship to Book, named like OrderItem's backref
+    book = db.relationship('Book')
+    
+    def subtotal(self):
+        """Calculate subtotal for this item"""
+        return self.quantity * self.price
+    
+    def __repr__(self):
+        return f'<ArchivedOrderItem {self.id}>'
+
+class OrderStatusChange(db.Model):
+    """
+    OrderStatusChange model for the status history of orders
+    One row per change, appended in bulk by the batch status updates
+    """
+    __tablename__ = 'order_status_history'
+    __table_args__ = (
+        db.Index('ix_order_status_history_order_changed', 'order_id', 'changed_at'),
+    )
+    
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # The order keeps its id when it is archived, so there is no foreign key
+    # to either orders table
+    order_id = db.Column(db.Integer, nullable=False)
+    
+    # Change details
+    from_status = db.Column(db.String(20), nullable=False)
+    to_status = db.Column(db.String(20), nullable=False)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    changed_by = db.Column(db.Integer, db.ForeignKey('users.id'))  # None when run from the CLI
+    
+    def __repr__(self):
+        return f'<OrderStatusChange {self.order_id} {self.from_status}->{self.to_status}>'
+
+class StockReservation(db.Model):
+    """
+    StockReservation model for holding cart quantities during checkout
+    A hold only counts against available stock until it expires
+    """
+    __tablename__ = 'stock_reservations'
+    __table_args__ = (
+        db.Index('ix_stock_reservations_book_expires', 'book_id', 'expires_at'),
+    )
+    
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # Foreign keys
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
+    
+    # Hold details
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def is_active(self):
+        """Check if the hold has not expired yet"""
+        return self.expires_at > datetime.utcnow()
+    
+    def __repr__(self):
+        return f'<StockReservation {self.book_id} x{self.quantity}>'
+
+
+
+class RateLimitBucket(db.Model):
+    """
+    RateLimitBucket model for sharing token buckets between worker processes
+    Only used when RATELIMIT_BACKEND is 'sqlite'
+    """
+    __tablename__ = 'rate_limit_buckets'
+    
+    # Bucket key, e.g. 'login:203.0.113.7'
+    key = db.Column(db.String(200), primary_key=True)
+    
+    # Bucket state
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # Unix timestamp
+    allowed = db.Column(db.Boolean, nullable=False, default=True)  # Outcome of the last request
+    
+    def __repr__(self):
+        return f'<RateLimitBucket {self.key}>'
+
+def create_missing_columns():
+    """
+    Add any declared column that an existing table is missing
+    Only suitable for nullable columns, which is how new columns are added
+    """
+    inspector = db.inspect(db.engine)
+    created = []
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    connection.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    created.append(f'{table.name}.{column.name}')
+    return created
+
+
+def create_missing_indexes():
+    """
+    Create any declared index that an existing database is missing
+    db.create_all() skips tables that already exist, so older databases
+    need this to pick up indexes added after they were created
+    """
+    inspector = db.inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                created.append(index.name)
+    return created
@@ -0,0 +1,170 @@
+"""
+Batch order status changes for Online Bookstore
+Moves many orders to a new status at once, e.g. every Processing order
+placed before today to Shipped when the warehouse ships a day's orders.
+Orders are taken in chunks of ORDER_STATUS_BATCH_SIZE; for each chunk one
+INSERT ... SELECT appends the status history and one UPDATE changes the
+status, both limited in SQL to the orders whose current status may move to
+the new one, and each chunk is its own transaction.
+"""
+import re
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from models import db, Order, OrderStatusChange
+
+orders = Order.__table__
+history = OrderStatusChange.__table__
+
+STATUSES = ('Pending', 'Processing', 'Shipped', 'Delivered', 'Cancelled')
+
+# The statuses an order may be moved to each status from
+ALLOWED_FROM = {
+    'Pending': (),
+    'Processing': ('Pending',),
+    'Shipped': ('Pending', 'Processing'),
+    'Delivered': ('Shipped',),
+    'Cancelled': ('Pending', 'Processing'),
+}
+
+
+class TransitionError(ValueError):
+    """A batch that asks for a status change that is never allowed"""
+
+
+class BatchResult:
+    """Outcome of a batch: orders changed, orders skipped by current status, unknown ids"""
+
+    def __init__(self, to_status):
+        self.to_status = to_status
+        self.changed = 0
+        self.skipped = {}
+        self.missing = 0
+
+    def summary(self):
+        """One-line report, e.g. 'Moved 120 orders to Shipped; skipped 2 Delivered'"""
+        text = f'Moved {self.changed} order{"s" if self.changed != 1 else ""} to {self.to_status}'
+        skipped = [f'{count} {status}' for status, count in sorted(self.skipped.items())]
+        if self.missing:
+            skipped.append(f'{self.missing} not found')
+        if skipped:
+            text += '; skipped ' + ', '.join(skipped)
+        return text
+
+
+def parse_ids(text):
+    """Order ids from text separated by commas, spaces or new lines; '#' prefixes are allowed"""
+    ids = []
+    for token in re.split(r'[\s,;]+', text or ''):
+        token = token.lstrip('#')
+        if not token:
+            continue
+        if not token.isdigit():
+            raise ValueError(f'"{token}" is not an order id')
+        ids.append(int(token))
+    return list(dict.fromkeys(ids))
+
+
+def _sources(to_status, from_status=None):
+    """Statuses to move from, checked against ALLOWED_FROM"""
+    if to_status not in ALLOWED_FROM:
+        raise TransitionError(f'Unknown status {to_status}')
+    sources = ALLOWED_FROM[to_status]
+    if from_status:
+        if from_status not in sources:
+            raise TransitionError(f'{from_status} orders can\'t be moved to {to_status}')
+        sources = (from_status,)
+    if not sources:
+        raise TransitionError(f'Orders can\'t be moved back to {to_status}')
+    return sources
+
+
+def _apply_chunk(ids, to_status, sources, placed_before, changed_by, changed_at):
+    """Append the history and change the status of the eligible orders among ids"""
+    eligible = db.and_(orders.c.id.in_(ids), orders.c.status.in_(sources))
+    if placed_before:
+        eligible = db.and_(eligible, orders.c.order_date < placed_before)
+    db.session.execute(history.insert().from_select(
+        ['order_id', 'from_status', 'to_status', 'changed_at', 'changed_by'],
+        db.select(orders.c.id, orders.c.status, db.literal(to_status), db.literal(changed_at),
+                  db.literal(changed_by) if changed_by is not None else db.null())
+        .where(eligible)
+    ))
+    return db.session.execute(orders.update().where(eligible).values(status=to_status)).rowcount
+
+
+def change_status(to_status, order_ids=None, from_status=None, placed_before=None, changed_by=None,
+                  batch_size=None):
+    """
+    Move the given orders, or the orders matching the filters, to to_status
+    The filters also narrow down given orders. Orders whose current status doesn't
+    allow the change, or placed too late, are left alone and counted in the result.
+    Returns a BatchResult
+    """
+    sources = _sources(to_status, from_status)
+    batch_size = batch_size or current_app.config['ORDER_STATUS_BATCH_SIZE']
+    result = BatchResult(to_status)
+    changed_at = datetime.utcnow()
+
+    try:
+        if order_ids is not None:
+            for start in range(0, len(order_ids), batch_size):
+                ids = order_ids[start:start + batch_size]
+                in_range = Order.order_date < placed_before if placed_before else db.literal(True)
+                found = 0
+                for status, placed_in_range, count in \
+                        db.session.query(Order.status, in_range, db.func.count()) \
+                        .filter(Order.id.in_(ids)).group_by(Order.status, in_range):
+                    found += count
+                    if status not in sources:
+                        result.skipped[status] = result.skipped.get(status, 0) + count
+                    elif not placed_in_range:
+                        result.skipped['placed later'] = result.skipped.get('placed later', 0) + count
+                result.missing += len(ids) - found
+                result.changed += _apply_chunk(ids, to_status, sources, placed_before, changed_by, changed_at)
+                db.session.commit()
+        else:
+            # Chunks follow the id, so orders changed meanwhile are not revisited
+            query = db.session.query(Order.id).filter(Order.status.in_(sources))
+            if placed_before:
+                query = query.filter(Order.order_date < placed_before)
+            last_id = 0
+            while True:
+                ids = [row[0] for row in query.filter(Order.id > last_id)
+                       .order_by(Order.id).limit(batch_size)]
+                if not ids:
+                    break
+                result.changed += _apply_chunk(ids, to_status, sources, placed_before, changed_by, changed_at)
+                db.session.commit()
+                last_id = ids[-1]
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
+
+
+@click.command('set-order-status')
+@click.argument('status', type=click.Choice(STATUSES))
+@click.argument('order_ids', nargs=-1, type=int)
+@click.option('--from-status', type=click.Choice(STATUSES), help='Only orders currently in this status')
+@click.option('--before', type=click.DateTime(['%Y-%m-%d']), help='Only orders placed before this date')
+@click.option('--batch-size', type=int, default=None, help='Orders changed per transaction')
+@with_appcontext
+def set_order_status_command(status, order_ids, from_status, before, batch_size):
+    """Move the given orders, or all orders matching the filters, to STATUS"""
+    if not order_ids and not from_status and not before:
+        raise click.UsageError('Give order ids or at least one of --from-status and --before')
+    try:
+        ids = list(dict.fromkeys(order_ids)) if order_ids else None
+        result = change_status(status, ids, from_status, before, batch_size=batch_size)
+    except TransitionError as error:
+        raise click.ClickException(str(error))
+    print(result.summary() + '.')
+
+
+def init_app(app):
+    """Register the CLI command"""
+    app.cli.add_command(set_order_status_command)
@@ -0,0 +1,177 @@
+"""
+Order writer for Online Bookstore
+SQLite lets one connection write at a time, so concurrent checkouts that
+each flush and commit their own order queue up on the write lock and, at
+peak, give up with "database is locked".
+
+With ORDER_WRITER_ENABLED, checkout() hands its validated order to a single
+writer thread per process instead. The writer collects whatever orders
+arrive within ORDER_WRITER_MAX_WAIT seconds (up to ORDER_WRITER_MAX_BATCH),
+places each one in its own savepoint and commits them all in one
+transaction (group commit), then hands every waiting request its order id
+or the reason its order failed. Without it, orders are placed and committed
+on the request thread as before.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Order
+import reservations
+
+
+class OrderRejected(Exception):
+    """An order that could not be placed; the message is shown to the customer"""
+
+
+class OrderIntent:
+    """A validated checkout: who is ordering and where it ships; the items are the user's holds"""
+
+    def __init__(self, user_id, shipping_address, shipping_city, shipping_postal_code,
+                 shipping_phone, payment_method):
+        self.user_id = user_id
+        self.shipping_address = shipping_address
+        self.shipping_city = shipping_city
+        self.shipping_postal_code = shipping_postal_code
+        self.shipping_phone = shipping_phone
+        self.payment_method = payment_method
+        self.future = Future()
+
+
+def place_order(intent):
+    """Create the order from the user's active holds and take the stock, returns the order id"""
+    items = reservations.held_items(intent.user_id)
+    if not items:
+        raise OrderRejected('Your reserved items have expired. Please check your cart and try again.')
+
+    order = Order(
+        user_id=intent.user_id,
+        total_amount=sum(item['subtotal'] for item in items),
+        shipping_address=intent.shipping_address,
+        shipping_city=intent.shipping_city,
+        shipping_postal_code=intent.shipping_postal_code,
+        shipping_phone=intent.shipping_phone,
+        payment_method=intent.payment_method
+    )
+    db.session.add(order)
+    db.session.flush()  # Get order ID
+
+    # Create order items from the holds and update stock
+    reservations.convert_to_order_items(order, intent.user_id, items)
+    return order.id
+
+
+class OrderWriter:
+    """Single thread that places queued orders in batches, one commit per batch"""
+
+    def __init__(self, app):
+        self.app = app
+        self.queue = queue.Queue(maxsize=app.config['ORDER_WRITER_MAX_PENDING'])
+        self.pid = os.getpid()
+        self.thread = threading.Thread(target=self._run, daemon=True, name='order-writer')
+        self.thread.start()
+
+    def _next_batch(self):
+        """Block for one order, then take whatever else arrives within MAX_WAIT"""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.app.config['ORDER_WRITER_MAX_WAIT']
+        while len(batch) < self.app.config['ORDER_WRITER_MAX_BATCH']:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        """Place every order of the batch and commit once"""
+        if db.engine.dialect.name == 'sqlite':
+            # Take the write lock up front: a transaction that reads first and
+            # writes later is refused ("database is locked") rather than made
+            # to wait when another connection is writing in the meantime
+            db.session.execute(db.text('BEGIN IMMEDIATE'))
+
+        results = []
+        for intent in batch:
+            # What the facet and snapshot hooks recorded before this order
+            info = {key: value.copy() if isinstance(value, dict) else value
+                    for key, value in db.session.info.items()}
+            try:
+                # A failing order only rolls back its own savepoint
+                with db.session.begin_nested():
+                    results.append((intent, place_order(intent), None))
+            except (OrderRejected, SQLAlchemyError) as error:
+                results.append((intent, None, error))
+                # Forget the book changes its savepoint flushed and undid
+                db.session.info.clear()
+                db.session.info.update(info)
+
+        try:
+            db.session.commit()
+        except SQLAlchemyError as error:
+            db.session.rollback()
+            self.app.logger.exception('Committing a batch of %d orders failed', len(batch))
+            results = [(intent, None, error) for intent, _, _ in results]
+
+        for intent, order_id, error in results:
+            if error is None:
+                intent.future.set_result(order_id)
+            else:
+                intent.future.set_exception(error)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            with self.app.app_context():
+                try:
+                    self._write(batch)
+                except Exception as error:  # Never leave a request waiting
+                    self.app.logger.exception('Order writer failed')
+                    for intent in batch:
+                        if not intent.future.done():
+                            intent.future.set_exception(error)
+                finally:
+                    db.session.remove()
+
+
+_lock = threading.Lock()
+_writer = None
+
+
+def _get_writer():
+    """This process's writer, started on first use (and again after a fork)"""
+    global _writer
+    with _lock:
+        if _writer is None or _writer.pid != os.getpid():
+            _writer = OrderWriter(current_app._get_current_object())
+        return _writer
+
+
+def submit(intent):
+    """
+    Place an order and return its id, raising OrderRejected when it can't be placed
+    Goes through the writer thread when ORDER_WRITER_ENABLED, else commits right here
+    """
+    if not current_app.config['ORDER_WRITER_ENABLED']:
+        order_id = place_order(intent)
+        db.session.commit()
+        return order_id
+
+    # The request's session may hold the holds it just renewed; the writer
+    # uses its own session, so finish this one's transaction first
+    db.session.commit()
+    _get_writer().queue.put(intent)
+    try:
+        return intent.future.result(timeout=current_app.config['ORDER_WRITER_TIMEOUT'])
+    except TimeoutError:
+        current_app.logger.error('Order for user %s not written within %ss', intent.user_id,
+                                 current_app.config['ORDER_WRITER_TIMEOUT'])
+        raise OrderRejected('Your order is still being processed. Please check your dashboard '
+                            'before ordering again.')
+    except SQLAlchemyError:
+        raise OrderRejected('Your order could not be placed. Please try again.')
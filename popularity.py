@@ -0,0 +1,123 @@
+"""
+Book popularity for Online Bookstore
+Keeps the copies sold per book in the last 7 and 30 days on the books table
+(sales_7d, sales_30d), so the bestselling sort and the featured books read
+a stored, indexed value instead of aggregating orders on every request.
+
+Checkout adds the sold quantities to both counts as part of the order's
+transaction. A periodic refresh recomputes them from the order items of the
+last 30 days (skipping cancelled orders), which drops the sales that have
+left a window and corrects any drift, and writes only the counts that
+changed.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from models import db, Book, Order, OrderItem
+
+books = Book.__table__
+
+
+def add_sale(book, quantity):
+    """Count a sale at checkout; book is the Book whose stock the order takes"""
+    book.sales_7d = (book.sales_7d or 0) + quantity
+    book.sales_30d = (book.sales_30d or 0) + quantity
+
+
+def recent_sales(now=None):
+    """{book_id: (sold in 7 days, sold in 30 days)} from the orders of the last 30 days"""
+    now = now or datetime.utcnow()
+    week_ago = now - timedelta(days=7)
+    sold_7d = db.func.sum(db.case((Order.order_date >= week_ago, OrderItem.quantity), else_=0))
+    rows = db.session.query(OrderItem.book_id, sold_7d, db.func.sum(OrderItem.quantity)) \
+        .join(Order, Order.id == OrderItem.order_id) \
+        .filter(Order.order_date >= now - timedelta(days=30), Order.status != 'Cancelled') \
+        .group_by(OrderItem.book_id)
+    return {book_id: (sold_7d, sold_30d) for book_id, sold_7d, sold_30d in rows}
+
+
+def refresh(batch_size=None):
+    """
+    Recompute the rolling counts and write the ones that changed, in chunks
+    Returns the number of books updated
+    """
+    batch_size = batch_size or current_app.config['POPULARITY_BATCH_SIZE']
+    sales = recent_sales()
+
+    # Books currently counted as selling, found through ix_books_sales_stock
+    current = {book_id: (sold_7d or 0, sold_30d or 0) for book_id, sold_7d, sold_30d in
+               db.session.query(Book.id, Book.sales_7d, Book.sales_30d).filter(Book.sales_30d > 0)}
+    # Books without recent sales go back to zero
+    counts = {book_id: (0, 0) for book_id in current}
+    counts.update(sales)
+    changed = [
+        {'book_id': book_id, 'sold_7d': sold_7d, 'sold_30d': sold_30d}
+        for book_id, (sold_7d, sold_30d) in counts.items()
+        if current.get(book_id, (0, 0)) != (sold_7d, sold_30d)
+    ]
+
+    statement = books.update().where(books.c.id == db.bindparam('book_id')).values(
+        sales_7d=db.bindparam('sold_7d'),
+        sales_30d=db.bindparam('sold_30d'),
+        # Not a change to the book itself, so sitemaps and feeds don't redo it
+        updated_at=books.c.updated_at,
+    )
+    try:
+        for start in range(0, len(changed), batch_size):
+            db.session.execute(statement, changed[start:start + batch_size])
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if changed:
+        import catalog_snapshot
+        import facets
+
+        # Core UPDATEs bypass the ORM events that keep the facet bitmaps current
+        facets.invalidate()
+        catalog_snapshot.publish()
+    return len(changed)
+
+
+def _refresher_loop(app):
+    """Background loop that lets old sales drop out of the rolling counts"""
+    while True:
+        time.sleep(app.config['POPULARITY_REFRESH_INTERVAL'])
+        with app.app_context():
+            try:
+                refresh()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Popularity refresh failed')
+            finally:
+                db.session.remove()
+
+
+@click.command('refresh-popularity')
+@click.option('--batch-size', type=int, default=None, help='Books updated per transaction')
+@with_appcontext
+def refresh_popularity_command(batch_size):
+    """Recompute the 7- and 30-day sales of every book (also fills them in after upgrade-db)"""
+    start = time.perf_counter()
+    updated = refresh(batch_size)
+    print(f'Updated the sales counts of {updated} books in {time.perf_counter() - start:.1f}s.')
+
+
+def init_app(app):
+    """Register the CLI command and start the background refresher on first request"""
+    app.cli.add_command(refresh_popularity_command)
+    started = threading.Event()
+
+    @app.before_request
+    def start_refresher():
+        if started.is_set() or not app.config['POPULARITY_REFRESHER_ENABLED']:
+            return
+        started.set()
+        threading.Thread(target=_refresher_loop, args=(app,), daemon=True,
+                         name='popularity-refresher').start()
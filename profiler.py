@@ -0,0 +1,185 @@
+"""
+Request profiler for Online Bookstore
+Profiles a random sample of requests, or any request carrying a signed
+admin token header, with cProfile plus a stack sampler. Each profile is
+written to PROFILER_DIR as a .prof (pstats) file, a .folded file of
+collapsed stacks (for flamegraph.pl / speedscope) and a small .json record.
+Only the newest PROFILER_MAX_PROFILES are kept. With PROFILER_ENABLED off
+no hooks are registered at all.
+"""
+import cProfile
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+import click
+from flask import current_app, g, request
+from flask.cli import with_appcontext
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+TOKEN_SALT = 'request-profiler'
+
+
+def _serializer(app):
+    return URLSafeTimedSerializer(app.secret_key, salt=TOKEN_SALT)
+
+
+def make_token(user_id):
+    """Signed token that makes the profiler capture requests sent with it"""
+    return _serializer(current_app).dumps({'user': user_id})
+
+
+def _token_valid(app, token):
+    try:
+        _serializer(app).loads(token, max_age=app.config['PROFILER_TOKEN_MAX_AGE'])
+    except BadSignature:
+        return False
+    return True
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval, counting collapsed stacks"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='stack-sampler')
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Stacks in the 'root;...;leaf count' format used by flame graph tools"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _should_profile(app):
+    header = request.headers.get(app.config['PROFILER_HEADER'])
+    if header:
+        return _token_valid(app, header)
+    return random.random() < app.config['PROFILER_SAMPLE_RATE']
+
+
+def _save(app, record, profile, sampler):
+    """Write one profile's files, then drop the oldest beyond the limit"""
+    directory = app.config['PROFILER_DIR']
+    os.makedirs(directory, exist_ok=True)
+
+    # Time first, so names sort oldest to newest
+    name = f'{record["started"]:.6f}-{os.getpid()}-{record["endpoint"]}'
+    record['name'] = name
+    base = os.path.join(directory, name)
+    profile.dump_stats(base + '.prof')
+    with open(base + '.folded', 'w') as file:
+        file.write(sampler.collapsed())
+    with open(base + '.json', 'w') as file:
+        json.dump(record, file)
+
+    records = sorted(entry for entry in os.listdir(directory) if entry.endswith('.json'))
+    for old in records[:-app.config['PROFILER_MAX_PROFILES']]:
+        for extension in ('.json', '.prof', '.folded'):
+            try:
+                os.remove(os.path.join(directory, old[:-len('.json')] + extension))
+            except FileNotFoundError:
+                pass
+
+
+def slowest_profiles(per_endpoint=5):
+    """Captured profiles grouped by endpoint, slowest first, as {endpoint: [record, ...]}"""
+    directory = current_app.config['PROFILER_DIR']
+    if not os.path.isdir(directory):
+        return {}
+
+    grouped = {}
+    for entry in os.listdir(directory):
+        if not entry.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, entry)) as file:
+                record = json.load(file)
+        except (OSError, ValueError):
+            continue  # Rotated away or still being written
+        grouped.setdefault(record['endpoint'], []).append(record)
+
+    return {
+        endpoint: sorted(records, key=lambda record: record['duration_ms'], reverse=True)[:per_endpoint]
+        for endpoint, records in sorted(grouped.items())
+    }
+
+
+@click.command('profile-token')
+@click.argument('username')
+@with_appcontext
+def profile_token_command(username):
+    """Print a profiler header token for an admin user"""
+    from models import User
+    user = User.query.filter_by(username=username).first()
+    if user is None or not user.is_admin():
+        raise click.ClickException(f'{username} is not an admin user.')
+    print(f'{current_app.config["PROFILER_HEADER"]}: {make_token(user.id)}')
+
+
+def init_app(app):
+    """Register the CLI command and, when enabled, the profiling hooks"""
+    app.cli.add_command(profile_token_command)
+
+    if not app.config['PROFILER_ENABLED']:
+        return
+
+    @app.before_request
+    def start_profile():
+        if request.endpoint == 'static' or not _should_profile(app):
+            return
+        sampler = StackSampler(threading.get_ident(), app.config['PROFILER_SAMPLE_INTERVAL'])
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return  # Another profiler is already active on this thread
+        sampler.start()
+        g.profile = (profile, sampler, time.time(), time.perf_counter())
+
+    # Teardown runs after a streamed response has been fully generated
+    @app.teardown_request
+    def finish_profile(error=None):
+        state = g.pop('profile', None)
+        if state is None:
+            return
+        profile, sampler, started, start = state
+        profile.disable()
+        sampler.stop()
+
+        record = {
+            'endpoint': request.endpoint or 'unknown',
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'started': started,
+            'captured': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started)),
+            'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+            'error': repr(error) if error else None,
+        }
+        try:
+            _save(app, record, profile, sampler)
+        except OSError:
+            app.logger.exception('Could not save request profile')
@@ -0,0 +1,47 @@
+"""
+Lightweight read projections for Online Bookstore
+Listing pages show a handful of columns per book. Querying BOOK_SUMMARY
+instead of Book loads only those columns, straight into BookSummary tuples:
+no identity map entry, no change tracking and no description text.
+"""
+from collections import namedtuple
+
+from sqlalchemy.orm import Bundle
+
+from models import db, Book
+
+
+class BookSummary(namedtuple('BookSummary', ['id', 'title', 'author', 'price', 'rating',
+                                             'stock_quantity', 'category', 'cover_image'])):
+    """The columns listing templates (and the cover_image macro) use"""
+    __slots__ = ()
+
+    def is_in_stock(self):
+        """Check if book is available in stock"""
+        return self.stock_quantity > 0
+
+
+class _SummaryBundle(Bundle):
+    """Builds a BookSummary from each result row"""
+
+    def create_row_processor(self, query, procs, labels):
+        def proc(row):
+            return BookSummary(*[getter(row) for getter in procs])
+        return proc
+
+
+BOOK_SUMMARY = _SummaryBundle('book_summary', *(getattr(Book, name) for name in BookSummary._fields),
+                              single_entity=True)
+
+
+def book_summaries():
+    """Query returning BookSummary records; filter and order it like Book.query"""
+    return db.session.query(BOOK_SUMMARY)
+
+
+def summaries_by_ids(ids):
+    """BookSummary records for the given ids, keeping the order of ids"""
+    if not ids:
+        return []
+    books = {book.id: book for book in book_summaries().filter(Book.id.in_(ids))}
+    return [books[book_id] for book_id in ids if book_id in books]
@@ -0,0 +1,241 @@
+"""
+Query plan checks for Online Bookstore
+Replays the catalog, search, cart, checkout, account and admin routes
+(including the ones that write, such as checkout and bulk changes) against a
+scratch copy of the SQLite database, captures every SQL statement they issue
+and runs EXPLAIN QUERY PLAN on it to catch full-table scans of large tables
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import click
+from sqlalchemy import event
+
+from models import db, User, Book, Order
+
+# Tables that grow with the business and must never be scanned in full
+LARGE_TABLES = {'users', 'books', 'orders', 'order_items', 'stock_reservations',
+                'orders_archive', 'order_items_archive'}
+
+# Full scans a check is known to need, reported but not failed: (check, table) -> reason
+EXPECTED_SCANS = {
+    ('search', 'books'): 'substring search (LIKE %...%) can\'t use an index; the route is rate limited',
+    ('bulk adjust', 'books'): 'a bulk change republishes the catalog snapshot from every book',
+    ('bulk csv', 'books'): 'a bulk change republishes the catalog snapshot from every book',
+}
+
+
+@contextmanager
+def capture_statements(engine):
+    """Collect (statement, query plan) for everything this thread executes on the engine"""
+    statements = []
+    # Background threads (warm-up, Bloom filter loads) use the same engine
+    thread = threading.get_ident()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread and \
+                statement.lstrip().upper().startswith(('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')):
+            # Planned on the statement's own connection, which also sees its
+            # temporary tables; one parameter set is enough for executemany()
+            plan = explain(cursor.connection, statement, parameters[0] if executemany else parameters)
+            statements.append((statement, plan))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def explain(connection, statement, parameters):
+    """Return the detail lines of SQLite's query plan for a statement, using a DBAPI connection"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def full_scans(statement, plan):
+    """
+    Return the large tables a plan reads in full
+    Walking an ordered index is only accepted when the statement has a LIMIT,
+    since SQLite can then stop after the first few rows
+    """
+    limited = ' LIMIT ' in ' '.join(statement.upper().split()) + ' '
+    scanned = []
+    for detail in plan:
+        words = detail.split()
+        if len(words) < 2 or words[0] != 'SCAN' or words[1] not in LARGE_TABLES:
+            continue
+        if 'COVERING INDEX' in detail or ('INDEX' in detail and limited):
+            continue
+        scanned.append(words[1])
+    return scanned
+
+
+def route_checks():
+    """
+    Build (description, session user, method, url, form data) tuples for the
+    routes to replay, in order: the cart checks build on each other's session
+    """
+    admin = User.query.filter_by(role='admin').first()
+    customer = User.query.filter_by(role='user').first()
+    book = Book.query.filter(Book.stock_quantity > 1).first() or Book.query.first()
+    order = Order.query.first()
+
+    checks = [
+        ('home', None, 'GET', '/', None),
+        ('catalog', None, 'GET', '/books', None),
+        ('catalog by category', None, 'GET', '/books?category=Fiction&sort=title', None),
+        ('catalog by price', None, 'GET', '/books?sort=price_asc', None),
+        ('catalog by rating', None, 'GET', '/books?sort=rating', None),
+        ('catalog by bestselling', None, 'GET', '/books?sort=bestselling', None),
+        ('search', None, 'GET', '/books?query=the&availability=any', None),
+        ('availability', None, 'GET', '/register/availability?username=someone&email=someone@example.com', None),
+    ]
+    if book:
+        checks.append(('book detail', None, 'GET', f'/book/{book.id}', None))
+    if customer and book:
+        checks += [
+            ('add to cart', customer, 'POST', f'/add_to_cart/{book.id}', {'quantity': 1}),
+            ('update cart', customer, 'POST', f'/update_cart/{book.id}', {'quantity': 2}),
+            ('cart', customer, 'GET', '/cart', None),
+            ('checkout form', customer, 'GET', '/checkout', None),
+            ('place order', customer, 'POST', '/checkout', {
+                'shipping_address': '1 Query Plan Street', 'shipping_city': 'Kathmandu',
+                'shipping_postal_code': '44600', 'shipping_phone': '9800000000',
+                'payment_method': 'Cash on Delivery'}),
+        ]
+    if customer:
+        checks += [
+            ('dashboard', customer, 'GET', '/dashboard', None),
+            ('dashboard history', customer, 'GET', '/dashboard/orders?page=2&history=1', None),
+        ]
+    if admin:
+        checks += [
+            ('admin dashboard', admin, 'GET', '/admin', None),
+            ('admin books', admin, 'GET', '/admin/books', None),
+            ('admin orders', admin, 'GET', '/admin/orders', None),
+            ('bulk changes', admin, 'GET', '/admin/books/bulk', None),
+            ('bulk adjust', admin, 'POST', '/admin/books/bulk/adjust',
+             {'category': 'Fiction', 'percent': 5, 'restock': 1, 'apply': 'Apply Changes'}),
+            ('batch order status', admin, 'POST', '/admin/orders/status',
+             {'from_status': 'Pending', 'to_status': 'Processing'}),
+        ]
+        if book:
+            checks.append(('bulk csv', admin, 'POST', '/admin/books/bulk/csv',
+                           {'csv_text': f'isbn,stock\n{book.isbn},1\n', 'apply': 'Apply Changes'}))
+        if order:
+            checks += [
+                ('order confirmation', admin, 'GET', f'/order_confirmation/{order.id}', None),
+                ('order status', admin, 'POST', f'/admin/order/update/{order.id}', {'status': 'Cancelled'}),
+            ]
+    return checks
+
+
+def _scratch_app(app, directory):
+    """An app like the given one on a copy of its database, writing nothing outside directory"""
+    from app import create_app
+
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite' or not db.engine.url.database:
+            raise click.ClickException('check-query-plans needs a SQLite database file')
+        source = db.engine.url.database
+    copy = os.path.join(directory, 'check.db')
+    with sqlite3.connect(source) as source_db, sqlite3.connect(copy) as copy_db:
+        source_db.backup(copy_db)
+
+    settings = {key: value for key, value in app.config.items() if key.isupper()}
+    settings.update(
+        SQLALCHEMY_DATABASE_URI='sqlite:///' + copy,
+        CATALOG_SNAPSHOT_PATH=os.path.join(directory, 'catalog_snapshot.bin'),
+        JINJA_BYTECODE_CACHE_DIR=None,
+        PROFILER_ENABLED=False,
+        METRICS_DIR=None,
+        SITEMAP_DIR=os.path.join(directory, 'sitemaps'),
+        # Background threads would run their statements outside the capture
+        WARMUP_ENABLED=False,
+        RESERVATION_SWEEPER_ENABLED=False,
+        POPULARITY_REFRESHER_ENABLED=False,
+        ORDER_WRITER_ENABLED=False,
+        RATELIMIT_ENABLED=False,
+        WTF_CSRF_ENABLED=False,
+    )
+    return create_app(type('QueryPlanConfig', (), settings))
+
+
+def check_routes(app):
+    """
+    Replay every route check on a copy of the database
+    Returns (route, table, statement) violations, except the EXPECTED_SCANS
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        return _check_routes(_scratch_app(app, directory))
+
+
+def _check_routes(app):
+    import catalog_snapshot
+    import facets
+
+    violations = []
+    client = app.test_client()
+
+    # The snapshot and facet index are built from full reads of the books
+    # table once per worker, not per request, so build them before capturing
+    with app.app_context():
+        catalog_snapshot.get_snapshot()
+        facets.get_index()
+        checks = route_checks()
+
+    current_user = None
+    for description, user, method, url, data in checks:
+        # Consecutive checks of one user share the session, e.g. the cart
+        if user is not current_user:
+            with client.session_transaction() as sess:
+                sess.clear()
+                if user:
+                    sess['_user_id'] = str(user.id)
+                    sess['_fresh'] = True
+            current_user = user
+
+        # A fresh app context per request so the logged-in user is not
+        # cached on g from the previous check
+        with app.app_context(), capture_statements(db.engine) as statements:
+            response = client.open(url, method=method, data=data)
+        if response.status_code >= 400:
+            violations.append((description, None, f'{method} {url} returned {response.status_code}'))
+
+        for statement, plan in statements:
+            for table in full_scans(statement, plan):
+                if (description, table) not in EXPECTED_SCANS:
+                    violations.append((description, table, statement))
+
+    return violations
+
+
+def init_app(app):
+    """Register the query plan CLI command"""
+
+    @app.cli.command('check-query-plans')
+    def check_query_plans():
+        """
+        Fail if any route does a full-table scan of a large table
+        Replays the catalog, search, availability, cart, checkout, account and
+        admin routes (bulk changes and order status too) on a scratch copy of
+        the database. Not covered: register, login, profile, book add/edit/
+        delete, covers, sitemaps and feeds.
+        """
+        violations = check_routes(app)
+        for description, table, statement in violations:
+            click.echo(f'[{description}] full scan of {table}:' if table else f'[{description}]', err=True)
+            click.echo('    ' + ' '.join(statement.split()), err=True)
+        if violations:
+            raise SystemExit(1)
+        for (description, table), reason in EXPECTED_SCANS.items():
+            click.echo(f'[{description}] scans {table} by design: {reason}')
+        click.echo('All other route queries use indexes.')
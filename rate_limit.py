@@ -0,0 +1,135 @@
+"""
+Rate limiting for Online Bookstore
+Token buckets keyed by client IP or user, with per-endpoint budgets set in
+Config.RATE_LIMITS. Buckets live in process memory by default; the 'sqlite'
+backend shares them between worker processes through a database table.
+"""
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, request, render_template, make_response
+from flask_login import current_user
+
+from models import db
+
+
+class MemoryBackend:
+    """Token buckets in a dict, shared by the threads of one process"""
+
+    # Drop refilled buckets once the dict grows past this many keys,
+    # checking at most every PRUNE_INTERVAL seconds
+    MAX_KEYS = 10000
+    PRUNE_INTERVAL = 10
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated_at, full_at)
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+
+    def consume(self, key, capacity, rate):
+        """Take one token, returns (allowed, tokens left)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            # Each bucket keeps when its own budget will have refilled it
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+
+            if len(self._buckets) > self.MAX_KEYS and now - self._pruned_at >= self.PRUNE_INTERVAL:
+                self._prune(now)
+        return allowed, tokens
+
+    def _prune(self, now):
+        """Forget buckets that would be full again anyway"""
+        self._buckets = {key: state for key, state in self._buckets.items() if state[2] > now}
+        self._pruned_at = now
+
+
+class SQLiteBackend:
+    """Token buckets in the rate_limit_buckets table, shared by every worker"""
+
+    # Refill, take a token if there is one and report the outcome in one statement
+    CONSUME = db.text('''
+        INSERT INTO rate_limit_buckets (key, tokens, updated_at, allowed)
+        VALUES (:key, :capacity - 1, :now, 1)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = MIN(:capacity, tokens + (:now - updated_at) * :rate)
+                     - (MIN(:capacity, tokens + (:now - updated_at) * :rate) >= 1),
+            allowed = MIN(:capacity, tokens + (:now - updated_at) * :rate) >= 1,
+            updated_at = :now
+        RETURNING allowed, tokens
+    ''')
+    # Every budget refills in per_seconds, so a bucket idle for the longest of
+    # them is full again and can go; each process prunes every PRUNE_INTERVAL
+    PRUNE = db.text('DELETE FROM rate_limit_buckets WHERE updated_at < :before')
+    PRUNE_INTERVAL = 60
+
+    def __init__(self):
+        self._pruned_at = 0.0
+
+    def consume(self, key, capacity, rate):
+        """Take one token, returns (allowed, tokens left)"""
+        now = time.time()
+        # Own connection and transaction, independent of the request's session
+        with db.engine.begin() as connection:
+            allowed, tokens = connection.execute(self.CONSUME, {
+                'key': key, 'capacity': capacity, 'rate': rate, 'now': now
+            }).one()
+            if now - self._pruned_at >= self.PRUNE_INTERVAL:
+                self._pruned_at = now
+                refill = max(budget['per_seconds'] for budget in current_app.config['RATE_LIMITS'].values())
+                connection.execute(self.PRUNE, {'before': now - refill})
+        return bool(allowed), tokens
+
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'sqlite': SQLiteBackend,
+}
+
+
+def _client_key(key_by):
+    """Identify the client a bucket belongs to"""
+    if key_by == 'user' and current_user.is_authenticated:
+        return f'user:{current_user.id}'
+    return f'ip:{request.remote_addr}'
+
+
+def _too_many_requests(retry_after):
+    """429 response telling the client when to try again"""
+    response = make_response(render_template('429.html', retry_after=retry_after), 429)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limited(name, when=None):
+    """
+    Limit a view with the budget Config.RATE_LIMITS[name]
+    If given, when() decides per request whether the limit applies
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            config = current_app.config
+            if config['RATELIMIT_ENABLED'] and (when is None or when()):
+                budget = config['RATE_LIMITS'][name]
+                capacity = budget['requests']
+                rate = capacity / budget['per_seconds']
+
+                key = f'{name}:{_client_key(budget.get("key", "ip"))}'
+                allowed, tokens = current_app.extensions['rate_limiter'].consume(key, capacity, rate)
+                if not allowed:
+                    return _too_many_requests(math.ceil((1 - tokens) / rate))
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def init_app(app):
+    """Create the configured bucket backend for this app"""
+    app.extensions['rate_limiter'] = BACKENDS[app.config['RATELIMIT_BACKEND']]()
@@ -0,0 +1,174 @@
+"""
+Stock reservations for Online Bookstore
+Holds cart quantities while a customer fills in the checkout form
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db, Book, OrderItem, StockReservation
+import popularity
+
+
+def _held_quantities(book_ids, exclude_user_id=None):
+    """Return {book_id: quantity} of active holds for the given books"""
+    if not book_ids:
+        return {}
+
+    query = db.session.query(
+        StockReservation.book_id,
+        db.func.sum(StockReservation.quantity)
+    ).filter(
+        StockReservation.book_id.in_(book_ids),
+        StockReservation.expires_at > datetime.utcnow()
+    )
+    if exclude_user_id is not None:
+        query = query.filter(StockReservation.user_id != exclude_user_id)
+
+    return dict(query.group_by(StockReservation.book_id).all())
+
+
+def available_stock(book, user_id=None):
+    """Stock that can still be sold, i.e. stock minus other customers' active holds"""
+    held = _held_quantities([book.id], exclude_user_id=user_id).get(book.id, 0)
+    return max(book.stock_quantity - held, 0)
+
+
+def release_holds(user_id):
+    """Drop every hold belonging to a user"""
+    StockReservation.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+
+
+def place_holds(user_id, cart):
+    """
+    Replace the user's holds with the quantities in their cart
+    Returns the titles of books that could not be held (empty list on success)
+    """
+    release_holds(user_id)
+
+    book_ids = [int(book_id) for book_id in cart]
+    # Lock the books (in id order, so checkouts can't deadlock) until this
+    # transaction ends; SQLite has no row locks and ignores FOR UPDATE
+    books = {book.id: book for book in
+             Book.query.filter(Book.id.in_(book_ids)).order_by(Book.id).with_for_update().all()}
+
+    expires_at = datetime.utcnow() + timedelta(minutes=current_app.config['RESERVATION_TTL_MINUTES'])
+    holds = [
+        {'user_id': user_id, 'book_id': int(book_id), 'quantity': quantity,
+         'expires_at': expires_at, 'created_at': datetime.utcnow()}
+        for book_id, quantity in cart.items()
+        if int(book_id) in books
+    ]
+    if holds:
+        db.session.execute(db.insert(StockReservation), holds)
+        db.session.flush()
+
+    # Insert first, then check: a concurrent checkout of the same books either
+    # sees our rows or we see theirs, so stock can never be over-committed.
+    # On SQLite that holds because one connection writes at a time; on
+    # databases with row-level locking the FOR UPDATE above serialises them
+    held = _held_quantities(list(books))
+    shortages = [
+        book.title for book in books.values()
+        if held.get(book.id, 0) > book.stock_quantity
+    ]
+    shortages += [f'Book #{book_id}' for book_id in book_ids if book_id not in books]
+
+    if shortages:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return shortages
+
+
+def held_items(user_id):
+    """Return the user's active holds as cart-style item dicts"""
+    rows = db.session.query(StockReservation, Book).join(
+        Book, StockReservation.book_id == Book.id
+    ).filter(
+        StockReservation.user_id == user_id,
+        StockReservation.expires_at > datetime.utcnow()
+    ).all()
+
+    return [
+        {'book': book, 'quantity': hold.quantity, 'subtotal': book.price * hold.quantity}
+        for hold, book in rows
+    ]
+
+
+def convert_to_order_items(order, user_id, items=None):
+    """Turn the user's active holds (or the given held_items()) into order items and take the stock"""
+    if items is None:
+        items = held_items(user_id)
+    order.set_summary([(item['book'].title, item['quantity']) for item in items])
+
+    # Re-read the stock under a row lock (same order as place_holds), so two
+    # checkouts of a book can't both subtract from the same old value; the
+    # loaded Book objects are refreshed in place and still feed the facet and
+    # snapshot hooks
+    book_ids = sorted(item['book'].id for item in items)
+    Book.query.filter(Book.id.in_(book_ids)).order_by(Book.id) \
+        .with_for_update().populate_existing().all()
+
+    for item in items:
+        db.session.add(OrderItem(
+            order_id=order.id,
+            book_id=item['book'].id,
+            quantity=item['quantity'],
+            price=item['book'].price
+        ))
+        item['book'].stock_quantity -= item['quantity']
+        popularity.add_sale(item['book'], item['quantity'])
+
+    release_holds(user_id)
+
+
+def sweep_expired(batch_size=None):
+    """Delete expired holds in batches, returns the number removed"""
+    batch_size = batch_size or current_app.config['RESERVATION_SWEEP_BATCH_SIZE']
+    removed = 0
+
+    while True:
+        ids = [row[0] for row in db.session.query(StockReservation.id).filter(
+            StockReservation.expires_at <= datetime.utcnow()
+        ).limit(batch_size).all()]
+        if not ids:
+            break
+
+        StockReservation.query.filter(StockReservation.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        removed += len(ids)
+
+    return removed
+
+
+def _sweeper_loop(app):
+    """Background loop that keeps the reservations table small"""
+    while True:
+        time.sleep(app.config['RESERVATION_SWEEP_INTERVAL'])
+        with app.app_context():
+            try:
+                sweep_expired()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Reservation sweep failed')
+
+
+def init_app(app):
+    """Register the sweeper CLI command and start the background sweeper on first request"""
+    started = threading.Event()
+
+    @app.before_request
+    def start_sweeper():
+        if started.is_set() or not app.config['RESERVATION_SWEEPER_ENABLED']:
+            return
+        started.set()
+        threading.Thread(target=_sweeper_loop, args=(app,), daemon=True,
+                         name='reservation-sweeper').start()
+
+    @app.cli.command('sweep-reservations')
+    def sweep_reservations():
+        """Remove expired stock reservations"""
+        print(f'Removed {sweep_expired()} expired reservations.')
@@ -0,0 +1,369 @@
+"""
+Sitemaps and product feed for Online Bookstore
+Gives crawlers and comparison sites every book without walking /books?page=N:
+a sitemap index (/sitemap.xml) pointing at sitemap files of SITEMAP_PAGE_SIZE
+books each, and a product feed with price and stock (/feeds/products.xml and
+/feeds/products.csv).
+
+Each book page k (ids k*size+1 .. (k+1)*size) is streamed from the database
+cursor straight into its sitemap file and its slice of the feed, so memory
+does not grow with the catalog. Later runs only redo the pages with books
+updated since the previous run, or whose number of books changed (deletes);
+the feeds are then reassembled from the stored slices. Every file is written
+next to a gzipped copy, which is served as-is to clients accepting gzip.
+
+Runs take a file lock, so only one process regenerates at a time, and write
+to per-process temporary files that are swapped in with os.replace(). Stale
+files are regenerated in a background thread; requests keep getting the
+previous version meanwhile.
+"""
+import csv
+import fcntl
+import gzip
+import io
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+import click
+from flask import abort, current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+
+from models import db, Book
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+FEED_FIELDS = ['id', 'title', 'author', 'isbn', 'category', 'price', 'currency',
+               'stock', 'availability', 'link', 'image_link']
+COLUMNS = (Book.id, Book.title, Book.author, Book.isbn, Book.category, Book.price,
+           Book.stock_quantity, Book.cover_image, Book.created_at, Book.updated_at)
+
+# Files a client may ask for, with their content types
+SITEMAP_FILE = re.compile(r'^sitemap-(pages|books-\d+)\.xml$')
+FEEDS = {'products.xml': 'application/xml', 'products.csv': 'text/csv'}
+
+
+def _tmp(path):
+    """Temporary name for writing path, unique to this process and thread"""
+    return f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+
+
+class _PrecompressedFile:
+    """Writes a file and its .gz copy side by side, swapped in atomically on close"""
+
+    def __init__(self, path):
+        self.path = path
+        self._tmp_paths = (_tmp(path), _tmp(f'{path}.gz'))
+        self._plain = open(self._tmp_paths[0], 'w', encoding='utf-8', newline='')
+        self._gzip = gzip.open(self._tmp_paths[1], 'wt', encoding='utf-8', newline='', compresslevel=9)
+
+    def write(self, text):
+        self._plain.write(text)
+        self._gzip.write(text)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._plain.close()
+        self._gzip.close()
+        if exc_type is None:
+            os.replace(self._tmp_paths[0], self.path)
+            os.replace(self._tmp_paths[1], f'{self.path}.gz')
+        else:
+            for tmp_path in self._tmp_paths:
+                os.remove(tmp_path)
+
+
+def _remove(path):
+    for name in (path, f'{path}.gz'):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def _lastmod(row):
+    changed = row.updated_at or row.created_at
+    return changed.strftime('%Y-%m-%d') if changed else None
+
+
+def sitemap_urls(entries):
+    """Sitemap XML for (url, lastmod) pairs, one chunk per entry"""
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n'
+    for url, lastmod in entries:
+        lastmod = f'<lastmod>{lastmod}</lastmod>' if lastmod else ''
+        yield f'<url><loc>{escape(url)}</loc>{lastmod}</url>\n'
+    yield '</urlset>\n'
+
+
+def sitemap_index(urls):
+    """Sitemap index XML listing the given sitemap URLs"""
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">\n'
+    for url in urls:
+        yield f'<sitemap><loc>{escape(url)}</loc></sitemap>\n'
+    yield '</sitemapindex>\n'
+
+
+def feed_record(row):
+    """Feed fields of one book row"""
+    return {
+        'id': row.id,
+        'title': row.title,
+        'author': row.author,
+        'isbn': row.isbn,
+        'category': row.category,
+        'price': f'{row.price:.2f}',
+        'currency': 'NPR',
+        'stock': row.stock_quantity,
+        'availability': 'in stock' if row.stock_quantity > 0 else 'out of stock',
+        'link': url_for('catalog.book_detail', book_id=row.id, _external=True),
+        'image_link': url_for('static', filename=f'images/book_covers/{row.cover_image}', _external=True)
+                      if row.cover_image else '',
+    }
+
+
+def feed_xml_item(record):
+    fields = ''.join(f'<{name}>{escape(str(record[name]))}</{name}>' for name in FEED_FIELDS)
+    return f'<product>{fields}</product>\n'
+
+
+def feed_csv_line(record):
+    line = io.StringIO()
+    csv.writer(line).writerow([record[name] for name in FEED_FIELDS])
+    return line.getvalue()
+
+
+def _page_rows(page, size):
+    """Books of one page in id order, streamed from the cursor"""
+    statement = db.select(*COLUMNS) \
+        .where(Book.id > page * size, Book.id <= (page + 1) * size).order_by(Book.id)
+    return db.session.execute(statement.execution_options(stream_results=True, yield_per=1000))
+
+
+def _write_page(directory, page, size):
+    """Write one book sitemap and its slices of the feeds in a single pass over the rows"""
+    parts = [os.path.join(directory, 'parts', f'products-{page}.{extension}') for extension in ('xml', 'csv')]
+    with _PrecompressedFile(os.path.join(directory, f'sitemap-books-{page}.xml')) as sitemap, \
+            open(_tmp(parts[0]), 'w', encoding='utf-8') as xml_part, \
+            open(_tmp(parts[1]), 'w', encoding='utf-8', newline='') as csv_part:
+        def book_entries():
+            for row in _page_rows(page, size):
+                record = feed_record(row)
+                xml_part.write(feed_xml_item(record))
+                csv_part.write(feed_csv_line(record))
+                yield record['link'], _lastmod(row)
+
+        for chunk in sitemap_urls(book_entries()):
+            sitemap.write(chunk)
+    # Only complete slices replace the previous ones
+    for path in parts:
+        os.replace(_tmp(path), path)
+
+
+def _write_feeds(directory, pages):
+    """Concatenate the stored slices into the complete feeds"""
+    parts = os.path.join(directory, 'parts')
+    with _PrecompressedFile(os.path.join(directory, 'products.xml')) as feed:
+        feed.write('<?xml version="1.0" encoding="UTF-8"?>\n<products>\n')
+        for page in pages:
+            with open(os.path.join(parts, f'products-{page}.xml'), encoding='utf-8') as part:
+                shutil.copyfileobj(part, feed)
+        feed.write('</products>\n')
+
+    with _PrecompressedFile(os.path.join(directory, 'products.csv')) as feed:
+        feed.write(','.join(FEED_FIELDS) + '\r\n')
+        for page in pages:
+            with open(os.path.join(parts, f'products-{page}.csv'), encoding='utf-8') as part:
+                shutil.copyfileobj(part, feed)
+
+
+def _write_index(directory, pages):
+    pages_entries = [(url_for('catalog.index', _external=True), None),
+                     (url_for('catalog.books', _external=True), None)]
+    with _PrecompressedFile(os.path.join(directory, 'sitemap-pages.xml')) as sitemap:
+        for chunk in sitemap_urls(pages_entries):
+            sitemap.write(chunk)
+
+    names = ['sitemap-pages.xml'] + [f'sitemap-books-{page}.xml' for page in pages]
+    with _PrecompressedFile(os.path.join(directory, 'sitemap.xml')) as index:
+        for chunk in sitemap_index(url_for('sitemap', filename=name, _external=True) for name in names):
+            index.write(chunk)
+
+
+def _load_state(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {'generated_at': None, 'pages': {}}
+
+
+@contextmanager
+def _file_lock(directory, wait=True):
+    """Lock shared by every process writing to directory; yields whether it was taken"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'generate.lock'), 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            locked = True
+        except BlockingIOError:
+            locked = False
+        try:
+            yield locked
+        finally:
+            if locked:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def generate(full=False):
+    """
+    Bring the sitemaps and feeds up to date with the books table, after any run
+    in another process has finished. Returns (pages rewritten, total pages)
+    """
+    with _file_lock(current_app.config['SITEMAP_DIR']):
+        return _generate(full)
+
+
+def _generate(full=False):
+    config = current_app.config
+    directory = config['SITEMAP_DIR']
+    size = config['SITEMAP_PAGE_SIZE']
+    os.makedirs(os.path.join(directory, 'parts'), exist_ok=True)
+    state_path = os.path.join(directory, 'state.json')
+    state = _load_state(state_path)
+    started = datetime.utcnow()
+
+    page_of = ((Book.id - 1) // size).label('page')
+    counts = {str(page): count for page, count in
+              db.session.query(page_of, db.func.count()).group_by(page_of)}
+    if full or state['generated_at'] is None:
+        changed = set(counts)
+    else:
+        since = datetime.fromisoformat(state['generated_at'])
+        changed = {page for page in counts if state['pages'].get(page) != counts[page]}
+        changed |= {str(page) for (page,) in
+                    db.session.query(page_of).filter(Book.updated_at >= since).distinct()}
+    removed = set(state['pages']) - set(counts)
+
+    # Links are built from SITE_URL, also when run from the command line
+    with current_app.test_request_context(base_url=config['SITE_URL']):
+        for page in sorted(changed, key=int):
+            _write_page(directory, int(page), size)
+        for page in removed:
+            _remove(os.path.join(directory, f'sitemap-books-{page}.xml'))
+            for extension in ('xml', 'csv'):
+                _remove(os.path.join(directory, 'parts', f'products-{page}.{extension}'))
+
+        pages = sorted(map(int, counts))
+        if changed or removed or not os.path.exists(os.path.join(directory, 'sitemap.xml')):
+            _write_feeds(directory, pages)
+            _write_index(directory, pages)
+    db.session.remove()
+
+    with open(_tmp(state_path), 'w', encoding='utf-8') as file:
+        json.dump({'generated_at': started.isoformat(), 'pages': counts}, file)
+    os.replace(_tmp(state_path), state_path)
+    return len(changed), len(pages)
+
+
+def _state_path():
+    return os.path.join(current_app.config['SITEMAP_DIR'], 'state.json')
+
+
+def _is_stale():
+    """Files missing or older than SITEMAP_MAX_AGE"""
+    try:
+        return time.time() - os.stat(_state_path()).st_mtime > current_app.config['SITEMAP_MAX_AGE']
+    except FileNotFoundError:
+        return True
+
+
+# Held while this process has a background regeneration running
+_refreshing = threading.Lock()
+
+
+def refresh_in_background():
+    """Start an incremental regeneration in a background thread when the files are stale"""
+    if not _is_stale() or not _refreshing.acquire(blocking=False):
+        return
+    app = current_app._get_current_object()
+
+    def run():
+        try:
+            with app.app_context(), _file_lock(app.config['SITEMAP_DIR'], wait=False) as locked:
+                # Another process may be at it, or have just finished
+                if locked and _is_stale():
+                    _generate()
+        except Exception:
+            app.logger.exception('Regenerating the sitemaps failed')
+        finally:
+            _refreshing.release()
+
+    threading.Thread(target=run, daemon=True, name='sitemap-refresh').start()
+
+
+def _send(filename, mimetype):
+    """Serve a generated file, the precompressed copy when the client accepts gzip"""
+    refresh_in_background()
+    if not os.path.exists(_state_path()):
+        # The first run hasn't finished yet
+        return 'Sitemaps are being generated, please retry shortly.\n', 503, \
+            {'Retry-After': '60', 'Content-Type': 'text/plain; charset=utf-8'}
+
+    directory = current_app.config['SITEMAP_DIR']
+    max_age = current_app.config['SITEMAP_MAX_AGE']
+    if 'gzip' in request.headers.get('Accept-Encoding', '').lower() \
+            and os.path.exists(os.path.join(directory, f'{filename}.gz')):
+        response = send_from_directory(directory, f'{filename}.gz', mimetype=mimetype, max_age=max_age)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype, max_age=max_age)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@click.command('generate-sitemaps')
+@click.option('--full', is_flag=True, help='Rewrite every file, not only the changed pages')
+@with_appcontext
+def generate_sitemaps_command(full):
+    """Write the sitemaps and product feeds (run from cron)"""
+    start = time.perf_counter()
+    changed, total = generate(full)
+    print(f'Rewrote {changed} of {total} book pages in {time.perf_counter() - start:.1f}s '
+          f'({current_app.config["SITEMAP_DIR"]})')
+
+
+def init_app(app):
+    """Register the sitemap, feed and robots.txt routes and the CLI command"""
+    app.cli.add_command(generate_sitemaps_command)
+
+    @app.route('/sitemap.xml')
+    def sitemap_index_file():
+        return _send('sitemap.xml', 'application/xml')
+
+    @app.route('/sitemaps/<filename>')
+    def sitemap(filename):
+        if not SITEMAP_FILE.match(filename):
+            abort(404)
+        return _send(filename, 'application/xml')
+
+    @app.route('/feeds/<filename>')
+    def product_feed(filename):
+        if filename not in FEEDS:
+            abort(404)
+        return _send(filename, FEEDS[filename])
+
+    @app.route('/robots.txt')
+    def robots_txt():
+        # Crawlers get every book from the sitemaps, not from deep catalog pages
+        lines = [
+            'User-agent: *',
+            'Disallow: /books?*page=',
+            'Disallow: /books?*query=',
+            f'Sitemap: {app.config["SITE_URL"].rstrip("/")}{url_for("sitemap_index_file")}',
+        ]
+        return '\n'.join(lines) + '\n', 200, {'Content-Type': 'text/plain; charset=utf-8'}
@@ -63,6 +63,34 @@ $(document).ready(function() {
         $(this).siblings('.invalid-feedback').remove();
     });
     
+    // ============= USERNAME / EMAIL AVAILABILITY =============
+    const registerForm = $('#registerForm');
+    const availabilityUrl = registerForm.data('availability-url');
+    if (availabilityUrl) {
+        let availabilityTimer = null;
+        registerForm.find('input[name="username"], input[name="email"]').on('input', function() {
+            const field = $(this);
+            const name = field.attr('name');
+            clearTimeout(availabilityTimer);
+            field.siblings('.availability-feedback').remove();
+            if (field.val().length < 3) {
+                return;
+            }
+            // Wait until typing pauses before asking the server
+            availabilityTimer = setTimeout(function() {
+                $.getJSON(availabilityUrl, {[name]: field.val()}, function(result) {
+                    if (!result[name] || result[name].value !== field.val()) {
+                        return;
+                    }
+                    field.siblings('.availability-feedback').remove();
+                    const available = result[name].available;
+                    field.after(`<div class="availability-feedback small ${available ? 'text-success' : 'text-danger'}">` +
+                                `${available ? 'Available' : 'Already taken'}</div>`);
+                });
+            }, 300);
+        });
+    }
+    
     // ============= SMOOTH SCROLLING =============
     $('a[href^="#"]').on('click', function(e) {
         e.preventDefault();
@@ -246,17 +274,21 @@ $(document).ready(function() {
     // ============= TOOLTIP INITIALIZATION =============
     $('[data-bs-toggle="tooltip"]').tooltip();
     
-    // ============= IMAGE LAZY LOADING =============
-    if ('loading' in HTMLImageElement.prototype) {
-        const images = document.querySelectorAll('img[loading="lazy"]');
-        images.forEach(img => {
-            img.src = img.dataset.src;
-        });
-    } else {
-        // Fallback for browsers that don't support lazy loading
-        const script = document.createElement('script');
-        script.src = 'https://cdnjs.cloudflare.com/ajax/libs/lazysizes/5.3.2/lazysizes.min.js';
-        document.body.appendChild(script);
+    // ============= NEXT PAGE PREFETCH =============
+    // Covers use native loading="lazy"; once the catalog pager scrolls into
+    // view, fetch the next page in the background so "Next" opens instantly
+    const nextPageLink = document.querySelector('.next-page-link');
+    if (nextPageLink && 'IntersectionObserver' in window) {
+        const observer = new IntersectionObserver(function(entries) {
+            if (entries.some(entry => entry.isIntersecting)) {
+                const prefetch = document.createElement('link');
+                prefetch.rel = 'prefetch';
+                prefetch.href = nextPageLink.href;
+                document.head.appendChild(prefetch);
+                observer.disconnect();
+            }
+        }, { rootMargin: '400px' });
+        observer.observe(nextPageLink);
     }
     
     // ============= COPY TO CLIPBOARD =============
@@ -267,6 +299,29 @@ $(document).ready(function() {
         });
     });
     
+    // ============= ORDER HISTORY LOAD MORE =============
+    $(document).on('click', '.btn-load-orders', function() {
+        const container = $(this).closest('.load-more');
+        $(this).prop('disabled', true).text('Loading...');
+
+        // The fragment holds the next cards plus its own Load more button
+        $.get($(this).data('url'), function(html) {
+            container.replaceWith(html);
+        }).fail(function() {
+            container.remove();
+        });
+    });
+
+    // ============= SERVICE WORKER =============
+    // Caches static files and catalog pages; the URL carries the asset
+    // version, so a deploy registers a new worker that drops old caches
+    const serviceWorkerUrl = $('body').data('service-worker');
+    if ('serviceWorker' in navigator && serviceWorkerUrl) {
+        navigator.serviceWorker.register(serviceWorkerUrl).catch(function(error) {
+            console.warn('Service worker registration failed:', error);
+        });
+    }
+    
     // ============= PRINT FUNCTIONALITY =============
     $('.print-btn').on('click', function() {
         window.print();
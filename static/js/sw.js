@@ -0,0 +1,121 @@
+/**
+ * Service worker for BookHaven Online Bookstore
+ * Registered as /sw.js?v=<asset version>&page_max_age=<seconds>; a new
+ * version (i.e. a deploy) installs a new worker that deletes old caches.
+ *
+ * - Fingerprinted static files, covers and pinned CDN files: cache first
+ * - Catalog pages and catalog JSON: stale-while-revalidate, except pages
+ *   the server sends with no-store (flash messages, a non-empty cart)
+ * - Cart, checkout, account and admin pages: network only
+ */
+
+const params = new URL(self.location).searchParams;
+const VERSION = params.get('v') || 'dev';
+const PAGE_MAX_AGE = (parseInt(params.get('page_max_age'), 10) || 1800) * 1000;
+
+const STATIC_CACHE = `bookhaven-static-${VERSION}`;
+const PAGES_CACHE = `bookhaven-pages-${VERSION}`;
+
+// Never served from cache; visiting one also marks cached pages as suspect,
+// because they redirect back with flash messages or change the navbar
+const NETWORK_ONLY = ['/cart', '/checkout', '/add_to_cart', '/update_cart', '/remove_from_cart',
+                      '/order_confirmation', '/login', '/logout', '/register', '/dashboard',
+                      '/profile', '/admin', '/metrics', '/sw.js'];
+const SESSION_CHANGES = ['/login', '/logout', '/register'];
+const CATALOG_PAGES = [/^\/$/, /^\/index$/, /^\/books$/, /^\/book\/\d+$/];
+const CDN_HOSTS = ['cdn.jsdelivr.net', 'cdnjs.cloudflare.com', 'fonts.googleapis.com',
+                   'fonts.gstatic.com', 'code.jquery.com'];
+
+// After a network-only request, pages go to the network for a few seconds
+// so the redirect target shows the fresh flash message
+const FRESH_WINDOW = 10 * 1000;
+let freshUntil = 0;
+
+self.addEventListener('install', event => {
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys().then(keys => Promise.all(
+            keys.filter(key => key.startsWith('bookhaven-') && key !== STATIC_CACHE && key !== PAGES_CACHE)
+                .map(key => caches.delete(key))
+        )).then(() => self.clients.claim())
+    );
+});
+
+function startsWithAny(path, prefixes) {
+    return prefixes.some(prefix => path === prefix || path.startsWith(prefix + '/'));
+}
+
+async function cacheFirst(request) {
+    const cache = await caches.open(STATIC_CACHE);
+    const cached = await cache.match(request);
+    if (cached) {
+        return cached;
+    }
+    const response = await fetch(request);
+    if (response.ok || response.type === 'opaque') {
+        cache.put(request, response.clone());
+    }
+    return response;
+}
+
+async function refreshPage(cache, request) {
+    const response = await fetch(request);
+    // A no-store page shows a flash or the cart badge, so every cached page
+    // has an outdated navbar now
+    if ((response.headers.get('Cache-Control') || '').includes('no-store')) {
+        await caches.delete(PAGES_CACHE);
+        return response;
+    }
+    // Only keep plain successful pages, not redirects to the login form
+    if (response.ok && !response.redirected) {
+        const headers = new Headers(response.headers);
+        headers.set('X-SW-Fetched', Date.now().toString());
+        const body = await response.clone().blob();
+        await cache.put(request, new Response(body, {status: response.status, headers: headers}));
+    }
+    return response;
+}
+
+async function staleWhileRevalidate(event) {
+    const request = event.request;
+    const cache = await caches.open(PAGES_CACHE);
+    const refresh = refreshPage(cache, request);
+
+    const cached = Date.now() < freshUntil ? null : await cache.match(request);
+    // Old pages carry expired CSRF tokens, so wait for the network instead
+    if (cached && Date.now() - parseInt(cached.headers.get('X-SW-Fetched'), 10) < PAGE_MAX_AGE) {
+        event.waitUntil(refresh.catch(() => null));
+        return cached;
+    }
+    return refresh.catch(() => cached || Response.error());
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+
+    if (url.origin !== self.location.origin) {
+        if (request.method === 'GET' && CDN_HOSTS.includes(url.hostname)) {
+            event.respondWith(cacheFirst(request));
+        }
+        return;
+    }
+
+    if (request.method !== 'GET' || startsWithAny(url.pathname, NETWORK_ONLY)) {
+        freshUntil = Date.now() + FRESH_WINDOW;
+        if (startsWithAny(url.pathname, SESSION_CHANGES)) {
+            // Cached pages show the previous user's navbar
+            event.waitUntil(caches.delete(PAGES_CACHE));
+        }
+        return;
+    }
+
+    if (url.pathname.startsWith('/static/') && url.searchParams.has('v')) {
+        event.respondWith(cacheFirst(request));
+    } else if (CATALOG_PAGES.some(pattern => pattern.test(url.pathname))) {
+        event.respondWith(staleWhileRevalidate(event));
+    }
+});
@@ -0,0 +1,68 @@
+"""
+Streamed rendering helpers for Online Bookstore
+Large admin tables are rendered with stream_template() while the rows are
+read from the database in batches, so the first bytes reach the browser
+straight away and memory stays bounded by the batch size, not the page size
+"""
+from flask import current_app, render_template, stream_template
+
+from models import db
+
+
+class StreamedPage:
+    """
+    One page of a query that is read lazily with yield_per
+    Offers the same attributes the templates use on a Flask-SQLAlchemy
+    Pagination; has_next is only known once the rows have been iterated,
+    which is the case by the time the template renders the page links
+    """
+
+    def __init__(self, query, page, per_page):
+        self.query = query
+        self.page = max(page, 1)
+        self.per_page = per_page
+        self.has_next = False
+
+    @property
+    def items(self):
+        return self
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+    def __iter__(self):
+        # Fetch one extra row to find out whether there is a next page
+        rows = self.query.offset((self.page - 1) * self.per_page).limit(self.per_page + 1) \
+            .yield_per(current_app.config['STREAM_YIELD_PER'])
+
+        for count, row in enumerate(rows):
+            if count == self.per_page:
+                self.has_next = True
+                break
+            yield row
+            # The template is done with this row, drop it from the session
+            # (projected rows such as BookSummary were never in it)
+            if isinstance(row, db.Model):
+                db.session.expunge(row)
+
+
+def render_listing(template_name, query, page, per_page, name, **context):
+    """
+    Render a paginated listing, streaming it when the page is large
+    The page object is passed to the template under the given name
+    """
+    if per_page > current_app.config['ADMIN_STREAM_THRESHOLD']:
+        context[name] = StreamedPage(query, page, per_page)
+        return stream_template(template_name, **context)
+
+    context[name] = query.paginate(page=page, per_page=per_page, error_out=False)
+    return render_template(template_name, **context)
@@ -0,0 +1,155 @@
+"""
+Template performance for Online Bookstore
+Caches compiled templates on disk so new workers skip compiling them, and
+times every template and block render next to the request's database time.
+The totals are sent in a Server-Timing header (visible in the browser's
+network panel) to admins, in debug mode or with SERVER_TIMING_PUBLIC, and
+slow requests are logged with their breakdown.
+"""
+import os
+import time
+
+from flask import g, has_request_context, request
+from flask_login import current_user
+from jinja2 import FileSystemBytecodeCache, Template
+from sqlalchemy import event
+
+from models import db
+
+
+class RequestTimings:
+    """Database and render time spent by one request"""
+
+    def __init__(self):
+        self.db_ms = 0.0
+        self.queries = 0
+        # Time in top-level renders; included templates and blocks are part of it
+        self.render_ms = 0.0
+        self.templates = {}  # 'name' or 'name#block' -> inclusive ms
+        self.depth = 0  # Timed renders currently producing output
+
+    def server_timing(self):
+        """Server-Timing header value"""
+        metrics = [f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+                   f'render;dur={self.render_ms:.1f}']
+        for number, (key, ms) in enumerate(sorted(self.templates.items(), key=lambda item: -item[1])):
+            metrics.append(f'tpl{number};dur={ms:.1f};desc="{key}"')
+        return ', '.join(metrics)
+
+
+def _current_timings():
+    return g.get('timings') if has_request_context() else None
+
+
+def _timed(key, render_func):
+    """Wrap a template or block render generator so the time spent in it is recorded"""
+
+    def timed_render(context):
+        timings = _current_timings()
+        if timings is None:
+            yield from render_func(context)
+            return
+
+        # Only time spent producing output counts, not time the (possibly
+        # streamed) consumer spends between chunks
+        root = timings.depth == 0
+        timings.depth += 1
+        elapsed = 0.0
+        chunks = render_func(context)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    elapsed += time.perf_counter() - start
+                    break
+                elapsed += time.perf_counter() - start
+                timings.depth -= 1
+                yield chunk
+                timings.depth += 1
+        finally:
+            timings.depth -= 1
+            timings.templates[key] = timings.templates.get(key, 0.0) + elapsed * 1000
+            if root:
+                timings.render_ms += elapsed * 1000
+
+    return timed_render
+
+
+class TimedTemplate(Template):
+    """Template whose root render function and blocks record their render time"""
+
+    @classmethod
+    def _from_namespace(cls, environment, namespace, globals):
+        template = super()._from_namespace(environment, namespace, globals)
+        template.root_render_func = _timed(template.name, template.root_render_func)
+        template.blocks = {
+            name: _timed(f'{template.name}#{name}', block)
+            for name, block in template.blocks.items()
+        }
+        return template
+
+
+def _track_queries(engine):
+    """Add each statement's execution time to the current request's timings"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('query_started')
+        # Empty when the statement began before these listeners were added
+        # (e.g. a background thread started earlier in create_app)
+        if not started:
+            return
+        started = started.pop()
+        timings = _current_timings()
+        if timings is not None:
+            timings.db_ms += (time.perf_counter() - started) * 1000
+            timings.queries += 1
+
+
+def init_app(app):
+    """Set up the bytecode cache and, when enabled, render and query timing"""
+    cache_dir = app.config['JINJA_BYTECODE_CACHE_DIR']
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+    if not app.config['RENDER_TIMING_ENABLED']:
+        return
+
+    app.jinja_env.template_class = TimedTemplate
+    with app.app_context():
+        _track_queries(db.engine)
+
+    @app.before_request
+    def start_timings():
+        g.timings = RequestTimings()
+
+    @app.after_request
+    def add_server_timing(response):
+        timings = g.get('timings')
+        # Streamed responses send their headers before rendering starts
+        if timings is None or response.is_streamed:
+            return response
+        value = timings.server_timing()
+        # Template names and DB timings are internals, not for every visitor
+        if app.debug or app.config['SERVER_TIMING_PUBLIC'] or \
+                (current_user.is_authenticated and current_user.is_admin()):
+            response.headers['Server-Timing'] = value
+        return response
+
+    @app.teardown_request
+    def log_slow_request(error=None):
+        timings = g.pop('timings', None)
+        if timings is None:
+            return
+        if timings.db_ms + timings.render_ms >= app.config['RENDER_TIMING_LOG_MS']:
+            app.logger.warning('Slow request %s %s: db %.1f ms (%d queries), render %.1f ms %s',
+                               request.method, request.path, timings.db_ms, timings.queries,
+                               timings.render_ms,
+                               {key: round(ms, 1) for key, ms in timings.templates.items()})
@@ -0,0 +1,159 @@
+"""
+Worker warm-up and readiness for Online Bookstore
+A freshly started worker compiles every template on first use, runs its
+first catalog queries against a cold page cache and builds its in-process
+caches while real requests wait. The warm-up does all of that in a
+background thread at startup instead, and GET /healthz answers 503 until
+it has finished, so a load balancer only sends traffic to warm workers.
+
+Steps: compile all templates, load the shared catalog snapshot, facet
+bitmaps and availability filters, run the home page, category and top-N
+book queries, and read the database file and the hot indexes so their
+pages are in the OS and SQLite caches.
+"""
+import threading
+import time
+
+from flask import current_app, jsonify
+from werkzeug.datastructures import MultiDict
+
+from models import db, Book
+
+# Per-process warm-up state, reported by /healthz
+_state = {'ready': False, 'started_at': None, 'duration_ms': None, 'steps': {}, 'errors': {}}
+
+
+def compile_templates(app):
+    """Load every template, which compiles it (and fills the bytecode cache)"""
+    names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def prime_caches(app):
+    """Load the catalog snapshot, facet bitmaps and availability filters"""
+    import availability
+    import catalog_snapshot
+    import facets
+
+    catalog_snapshot.get_snapshot()
+    facets.get_index()
+    if app.config['AVAILABILITY_FILTER_ENABLED']:
+        availability.wait_ready(app)
+
+
+def run_catalog_queries(app):
+    """The queries behind index() and the first page of books() for every sort and category"""
+    import catalog_snapshot
+    import facets
+    from projections import book_summaries, summaries_by_ids
+
+    per_page = app.config['BOOKS_PER_PAGE']
+    in_stock = book_summaries().filter(Book.stock_quantity > 0)
+    in_stock.order_by(Book.sales_30d.desc(), Book.sales_7d.desc(), Book.rating.desc()).limit(8).all()
+    in_stock.order_by(Book.created_at.desc()).limit(8).all()
+    categories = [name for (name,) in db.session.query(Book.category).distinct()]
+
+    snapshot = catalog_snapshot.get_snapshot()
+    if snapshot:
+        for sort in catalog_snapshot.SORT_KEYS:
+            summaries_by_ids(snapshot.listing(sort, limit=per_page))
+        for category in categories:
+            summaries_by_ids(snapshot.listing('title', category, limit=per_page))
+
+    # Also builds the facet index's sort orders
+    index = facets.get_index()
+    selected = facets.selected_filters(MultiDict())
+    index.counts(selected)
+    for sort in facets.SORTS:
+        summaries_by_ids(index.listing(index.filter(selected), sort, limit=per_page))
+    return len(categories)
+
+
+def touch_pages(app):
+    """Read the SQLite file and walk the indexes of the hot tables"""
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return 0
+
+    pages = 0
+    path = engine.url.database
+    if path and path != ':memory:':
+        remaining = app.config['WARMUP_PRELOAD_MAX_MB'] * 1024 * 1024
+        with open(path, 'rb') as file:
+            while remaining > 0 and file.read(min(remaining, 1024 * 1024)):
+                remaining -= 1024 * 1024
+
+    quote = engine.dialect.identifier_preparer.quote
+    inspector = db.inspect(engine)
+    with engine.connect() as connection:
+        for table in app.config['WARMUP_TABLES']:
+            if not inspector.has_table(table):
+                continue
+            for index in inspector.get_indexes(table):
+                columns = ', '.join(quote(name) for name in index['column_names'] if name)
+                connection.execute(db.text(
+                    f'SELECT COUNT(*) FROM (SELECT {columns} FROM {quote(table)} INDEXED BY {quote(index["name"])})'
+                ))
+                pages += 1
+    return pages
+
+
+STEPS = [
+    ('templates', compile_templates),
+    ('caches', prime_caches),
+    ('queries', run_catalog_queries),
+    ('pages', touch_pages),
+]
+
+
+def warm_up(app):
+    """Run every step, recording how long each took; a failed step doesn't stop the others"""
+    _state['started_at'] = time.time()
+    start = time.perf_counter()
+    with app.app_context():
+        # e.g. `flask init-db` on a fresh install: only the templates can be warmed
+        has_tables = db.inspect(db.engine).has_table(Book.__tablename__)
+        for name, step in STEPS:
+            if name != 'templates' and not has_tables:
+                continue
+            step_start = time.perf_counter()
+            try:
+                step(app)
+            except Exception as error:
+                db.session.rollback()
+                _state['errors'][name] = str(error)
+                app.logger.warning('Warm-up step %s failed', name, exc_info=True)
+            _state['steps'][name] = round((time.perf_counter() - step_start) * 1000, 1)
+            db.session.remove()
+
+    _state['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    _state['ready'] = True
+    app.logger.info('Warm-up finished in %.1f ms %s', _state['duration_ms'], _state['steps'])
+
+
+def init_app(app, start=False):
+    """
+    Register /healthz and, for serving workers (start=True), start the warm-up
+    in the background unless WARMUP_IN_BACKGROUND is off
+    """
+
+    @app.route('/healthz')
+    def healthz():
+        if not _state['ready']:
+            return jsonify(status='warming up', steps=_state['steps']), 503
+        try:
+            db.session.execute(db.text('SELECT 1'))
+        except Exception:
+            current_app.logger.exception('Health check could not reach the database')
+            return jsonify(status='database unavailable'), 503
+        return jsonify(status='ready', warmup_ms=_state['duration_ms'], steps=_state['steps'],
+                       errors=_state['errors'])
+
+    if not start or not app.config['WARMUP_ENABLED']:
+        _state['ready'] = True
+    elif app.config['WARMUP_IN_BACKGROUND']:
+        threading.Thread(target=warm_up, args=(app,), daemon=True, name='warmup').start()
+    else:
+        warm_up(app)